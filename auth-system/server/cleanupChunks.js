@@ -4,16 +4,27 @@ const path = require("path");
 
 const UPLOAD_DIR = path.join(__dirname, "uploads");
 const MAX_AGE_MINUTES = 15;
+// Same feature store predict.py writes to (PREDICT_FEATURE_DIR, default python-model/features)
+const FEATURE_DIR = process.env.PREDICT_FEATURE_DIR || path.join(__dirname, "python-model", "features");
+// Uploads and the per-chunk partial features predict.py stores for mic sessions
+// (kept longer, so a long session still finds its early partials when it ends)
+const SWEEP_DIRS = [
+  [UPLOAD_DIR, MAX_AGE_MINUTES],
+  [path.join(FEATURE_DIR, "chunks"), 8 * MAX_AGE_MINUTES],
+];
+// Mic chunk files (pcm_<socket>_<session>_<index>.f32) are swept per session: a session
+// still recording writes a chunk every few seconds, and grading it needs all of its chunks
+const SESSION_CHUNK_DIR = path.join(UPLOAD_DIR, "chunks");
 const now = Date.now();
 
-fs.readdir(UPLOAD_DIR, (err, files) => {
+const sweep = ([dir, maxAge]) => fs.readdir(dir, (err, files) => {
   if (err) {
-    console.error("❌ Failed to read upload folder:", err);
+    if (err.code !== "ENOENT") console.error("❌ Failed to read upload folder:", err);
     return;
   }
 
   files.forEach((file) => {
-    const filePath = path.join(UPLOAD_DIR, file);
+    const filePath = path.join(dir, file);
 
     fs.stat(filePath, (err, stats) => {
       if (err) {
@@ -23,7 +34,7 @@ fs.readdir(UPLOAD_DIR, (err, files) => {
 
       const ageMinutes = (now - stats.mtimeMs) / 60000;
 
-      if (ageMinutes > MAX_AGE_MINUTES) {
+      if (stats.isFile() && ageMinutes > maxAge) {
         fs.unlink(filePath, (err) => {
           if (err) {
             console.error("❌ Error deleting file:", file, err.message);
@@ -35,3 +46,41 @@ fs.readdir(UPLOAD_DIR, (err, files) => {
     });
   });
 });
+
+// 🎙️ Delete a session's chunks only once its newest chunk is MAX_AGE_MINUTES old (session over)
+const sweepSessions = (dir, maxAge) => fs.readdir(dir, (err, files) => {
+  if (err) {
+    if (err.code !== "ENOENT") console.error("❌ Failed to read chunk folder:", err);
+    return;
+  }
+
+  const sessions = {};
+  files.forEach((file) => {
+    const filePath = path.join(dir, file);
+    let stats;
+    try {
+      stats = fs.statSync(filePath);
+    } catch (err) {
+      console.error("❌ Stat error for:", file);
+      return;
+    }
+    if (!stats.isFile()) return;
+    const session = file.slice(0, file.lastIndexOf("_"));
+    sessions[session] = sessions[session] || { newest: 0, paths: [] };
+    sessions[session].newest = Math.max(sessions[session].newest, stats.mtimeMs);
+    sessions[session].paths.push(filePath);
+  });
+
+  Object.values(sessions)
+    .filter(({ newest }) => (now - newest) / 60000 > maxAge)
+    .forEach(({ paths }) => paths.forEach((filePath) => fs.unlink(filePath, (err) => {
+      if (err) {
+        console.error("❌ Error deleting file:", path.basename(filePath), err.message);
+      } else {
+        console.log("🗑️ Deleted old file:", path.basename(filePath));
+      }
+    })));
+});
+
+SWEEP_DIRS.forEach(sweep);
+sweepSessions(SESSION_CHUNK_DIR, MAX_AGE_MINUTES);
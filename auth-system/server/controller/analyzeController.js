@@ -1,5 +1,8 @@
-const { exec } = require("child_process");
+const { exec, spawn } = require("child_process");
 const path = require("path");
+const Feedback = require("../models/FeedbackModel");
+const { parsePredictOutput, PREDICT_MAX_BUFFER } = require("../utils/predictResult");
+const { PITCH_ARGS } = require("../utils/predictArgs");
 
 exports.analyzeAudio = (req, res) => {
   const { idealPath } = req.body;
@@ -22,23 +25,24 @@ const pythonPath = "python3"; // ✅ Linux
 
   const practiceFull = practiceFile ? practiceFile.path : null;
 
+  // Columnar output keeps long recordings well under the stdout buffer
   let command;
   if (idealFull && practiceFull) {
-    command = `${pythonPath} ${scriptPath} "${idealFull}" "${practiceFull}"`;
+    command = `${pythonPath} ${scriptPath} --format columnar ${PITCH_ARGS.join(" ")} "${idealFull}" "${practiceFull}"`;
   } else if (idealFull) {
-    command = `${pythonPath} ${scriptPath} "${idealFull}"`;
+    command = `${pythonPath} ${scriptPath} --format columnar ${PITCH_ARGS.join(" ")} "${idealFull}"`;
   } else if (practiceFull) {
-    command = `${pythonPath} ${scriptPath} "${practiceFull}"`;
+    command = `${pythonPath} ${scriptPath} --format columnar ${PITCH_ARGS.join(" ")} "${practiceFull}"`;
   }
 
-  exec(command, (err, stdout, stderr) => {
+  exec(command, { maxBuffer: PREDICT_MAX_BUFFER }, (err, stdout, stderr) => {
     if (err) {
       console.error("❌ Python error:", stderr);
       return res.status(500).json({ message: "Python script failed" });
     }
 
     try {
-      const result = JSON.parse(stdout);
+      const result = parsePredictOutput(stdout);
       res.status(200).json(result);
     } catch (e) {
       console.error("❌ Failed to parse Python JSON:", stdout);
@@ -47,6 +51,87 @@ const pythonPath = "python3"; // ✅ Linux
   });
 };
 
+// 📮 Queue an analysis instead of holding the request open; identical uploads share a job id
+exports.submitAnalysis = (req, res) => {
+  const { idealPath } = req.body;
+  const practiceFile = req.file;
+
+  if (!idealPath && !practiceFile) {
+    return res.status(400).json({ message: "At least one audio (ideal or practice) is required" });
+  }
+
+  const scriptPath = path.join(__dirname, "../python-model/predict.py");
+  const files = [
+    idealPath ? path.join(__dirname, "../uploads", path.basename(idealPath)) : null,
+    practiceFile ? practiceFile.path : null,
+  ].filter(Boolean);
+
+  exec(`python3 "${scriptPath}" --submit ${files.map((f) => `"${f}"`).join(" ")}`, (err, stdout, stderr) => {
+    if (err) {
+      console.error("❌ Python error:", stderr);
+      return res.status(500).json({ message: "Could not queue analysis" });
+    }
+    try {
+      const job = JSON.parse(stdout);
+      if (job.error) return res.status(400).json({ message: job.error });
+      res.status(202).json(job);
+    } catch (e) {
+      res.status(500).json({ message: "Invalid output from Python script" });
+    }
+  });
+};
+
+// 🔎 Poll a queued analysis: { status } while queued/running, plus { result } once done
+exports.analysisStatus = (req, res) => {
+  const jobId = req.params.id;
+  if (!/^[0-9a-f]{32}$/.test(jobId)) {
+    return res.status(400).json({ message: "Invalid job id" });
+  }
+
+  const scriptPath = path.join(__dirname, "../python-model/predict.py");
+  exec(`python3 "${scriptPath}" --status ${jobId}`, (err, stdout, stderr) => {
+    if (err) {
+      console.error("❌ Python error:", stderr);
+      return res.status(500).json({ message: "Could not read job status" });
+    }
+    try {
+      const entry = JSON.parse(stdout);
+      if (entry.error && !entry.status) return res.status(404).json({ message: entry.error });
+      res.status(200).json(entry);
+    } catch (e) {
+      res.status(500).json({ message: "Invalid output from Python script" });
+    }
+  });
+};
+
+
+// 📊 One stats block over every stored session of a user (per-chord accuracy, transitions, timing)
+exports.userStats = async (req, res) => {
+  let sessions;
+  try {
+    sessions = await Feedback.find({ userId: req.params.userId, stats: { $exists: true } }).select("stats").lean();
+  } catch (err) {
+    return res.status(500).json({ message: "Could not load sessions" });
+  }
+
+  const scriptPath = path.join(__dirname, "../python-model/predict.py");
+  const py = spawn("python3", [scriptPath, "aggregate", "-"]);
+  let stdout = "";
+  py.stdout.on("data", (data) => (stdout += data.toString()));
+  py.stderr.on("data", (data) => console.error("🐍 Python error:", data.toString()));
+  py.on("error", () => res.status(500).json({ message: "Could not aggregate sessions" }));
+  py.on("close", () => {
+    if (res.headersSent) return;
+    try {
+      const stats = JSON.parse(stdout);
+      if (stats.error) return res.status(500).json({ message: stats.error });
+      res.status(200).json(stats);
+    } catch (e) {
+      res.status(500).json({ message: "Invalid output from Python script" });
+    }
+  });
+  py.stdin.end(sessions.map((s) => JSON.stringify(s.stats)).join("\n"));
+};
 
 /*ye code bhiideal or oractice 
 const { exec } = require("child_process");
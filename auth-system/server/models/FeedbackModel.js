@@ -10,7 +10,9 @@ const feedbackSchema = new mongoose.Schema({
   accuracy: Number,
   starRating: Number,
   medal: String,
-  pitchAccuracy: Number
+  pitchAccuracy: Number,
+  transposition: Number, // semitones the take sat above the ideal (capo); graded in the ideal's key
+  stats: mongoose.Schema.Types.Mixed // predict.py session stats block, summed by /analyze/stats
 }, { timestamps: true });
 
 module.exports = mongoose.model("Feedback", feedbackSchema);
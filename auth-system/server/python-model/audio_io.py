@@ -0,0 +1,140 @@
+import os
+import shutil
+import subprocess
+
+from metrics import NULL_METRICS
+
+# 🎚️ Resampler used when the file's native rate differs from the analysis rate.
+# soxr_mq is noticeably cheaper than librosa's soxr_hq default and is plenty for chroma.
+RES_TYPE = os.environ.get("PREDICT_RES_TYPE", "soxr_mq")
+FFMPEG = os.environ.get("FFMPEG_PATH") or shutil.which("ffmpeg")
+# 📦 Longest decoded signal (float32 bytes at the analysis rate) held in memory at once;
+# longer recordings are decoded in BLOCK_SECONDS blocks and analysed incrementally
+DECODE_CAP_BYTES = int(float(os.environ.get("PREDICT_DECODE_CAP_MB", 64)) * 2**20)
+BLOCK_SECONDS = 10.0
+
+
+# 🔊 PCM formats (WAV/FLAC/OGG...) straight through libsndfile, no audioread fallback chain
+def decode_soundfile(path):
+    import soundfile as sf
+
+    data, native_sr = sf.read(path, dtype="float32", always_2d=True)
+    return data.mean(axis=1), native_sr
+
+# 🎞️ Anything else (WebM/Opus from the mic) through an ffmpeg pipe: ffmpeg downmixes and
+# resamples, and the PCM lands directly in a NumPy buffer without a temp WAV
+def decode_ffmpeg(path, sr):
+    import numpy as np
+
+    cmd = [FFMPEG, "-nostdin", "-v", "error", "-i", path, "-f", "f32le", "-ac", "1", "-ar", str(sr), "pipe:1"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed on {path}: {proc.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(proc.stdout, dtype="<f4").astype(np.float32)
+
+# 🔁 soxr directly when possible: same filters as librosa's soxr_* modes without importing librosa
+def resample(y, orig_sr, target_sr, res_type=RES_TYPE):
+    import numpy as np
+
+    if res_type.startswith("soxr_"):
+        try:
+            import soxr
+
+            return soxr.resample(y, orig_sr, target_sr, quality=res_type[len("soxr_"):].upper()).astype(np.float32)
+        except ImportError:
+            pass
+    import librosa
+
+    return librosa.resample(y, orig_sr=orig_sr, target_sr=target_sr, res_type=res_type)
+
+# 📏 Decoded size in bytes at `sr`, when the container header says (None for ffmpeg-only formats)
+def decoded_bytes(path, sr):
+    try:
+        import soundfile as sf
+
+        info = sf.info(path)
+    except (ImportError, RuntimeError):
+        return None
+    return int(info.frames * sr / info.samplerate) * 4
+
+# 🔁 Resampler for consecutive blocks: soxr's streaming resampler keeps filter state across
+# block edges, so the blocks join up exactly like a one-shot resample
+def _block_resampler(orig_sr, target_sr, res_type):
+    if orig_sr == target_sr:
+        return lambda y, last: y
+    if res_type.startswith("soxr_"):
+        try:
+            import soxr
+
+            stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype="float32", quality=res_type[len("soxr_"):].upper())
+            return lambda y, last: stream.resample_chunk(y, last=last)
+        except ImportError:
+            pass
+    return lambda y, last: resample(y, orig_sr, target_sr, res_type)  # per block; edges are not seamless
+
+def _ffmpeg_blocks(path, sr, block_seconds):
+    import numpy as np
+
+    cmd = [FFMPEG, "-nostdin", "-v", "error", "-i", path, "-f", "f32le", "-ac", "1", "-ar", str(sr), "pipe:1"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = proc.stdout.read(int(block_seconds * sr) * 4)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 4 * 4], dtype="<f4").astype(np.float32)
+    finally:
+        proc.stdout.close()
+        err = proc.stderr.read()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed on {path}: {err.decode(errors='replace').strip()}")
+
+# 🧱 Mono float32 blocks of about block_seconds at `sr`, decoded lazily so memory does not grow
+# with the file. Same decoder order as load_audio; the last-resort librosa.load is one block.
+def iter_audio(path, sr, res_type=RES_TYPE, block_seconds=BLOCK_SECONDS):
+    import numpy as np
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    try:
+        import soundfile as sf
+
+        native_sr = sf.info(path).samplerate
+    except (ImportError, RuntimeError):
+        if FFMPEG:
+            yield from _ffmpeg_blocks(path, sr, block_seconds)
+            return
+        y, _ = load_audio(path, sr, res_type)
+        yield y
+        return
+
+    resampler = _block_resampler(native_sr, sr, res_type)
+    for block in sf.blocks(path, blocksize=int(block_seconds * native_sr), dtype="float32", always_2d=True):
+        y = resampler(block.mean(axis=1), False)
+        if len(y):
+            yield y
+    tail = resampler(np.zeros(0, dtype=np.float32), True)
+    if len(tail):
+        yield tail
+
+# 📂 Decode once into mono float32 at `sr`; decoding and resampling are timed as separate stages
+def load_audio(path, sr, res_type=RES_TYPE, metrics=None):
+    metrics = metrics or NULL_METRICS
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    with metrics.stage("load"):
+        try:
+            y, native_sr = decode_soundfile(path)
+        except (ImportError, RuntimeError):
+            if FFMPEG:
+                # ffmpeg resamples while decoding, so there is no separate resample stage
+                return decode_ffmpeg(path, sr), sr
+            import librosa
+
+            y, native_sr = librosa.load(path, sr=None)
+
+    if native_sr != sr:
+        with metrics.stage("resample"):
+            y = resample(y, native_sr, sr, res_type)
+    return y, sr
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import multiprocessing
+
+import numpy as np
+
+import predict
+from audio_io import load_audio
+
+# ⏱️ Benchmark harness for predict.py hot paths on synthetic chord progressions.
+# Each clip length runs in a fresh process so peak RSS is per case, and prints one JSON line.
+DEFAULT_LENGTHS = [5, 30, 60, 300, 600]
+
+
+# 🎹 Random progression over the template bank, each chord 0.5-2 s of harmonic tones
+def synthesize(seconds, sr, seed=0):
+    rng = np.random.default_rng(seed)
+    names = list(predict.CHORD_TEMPLATES)
+    y = np.zeros(int(seconds * sr), dtype=np.float32)
+    truth = []
+    t = 0.0
+    while t < seconds:
+        name = names[rng.integers(len(names))]
+        dur = min(float(rng.uniform(0.5, 2.0)), seconds - t)
+        start, stop = int(t * sr), int((t + dur) * sr)
+        n = np.arange(stop - start) / sr
+        for pc in np.flatnonzero(predict.CHORD_TEMPLATES[name]):
+            f0 = 130.81 * 2 ** (pc / 12)  # C3 octave
+            for harmonic, amp in ((1, 1.0), (2, 0.5), (3, 0.25)):
+                y[start:stop] += amp * np.sin(2 * np.pi * f0 * harmonic * n).astype(np.float32)
+        y[start:stop] *= np.exp(-1.5 * n).astype(np.float32) * 0.05
+        truth.append({ "chord": name, "start": round(t, 2), "duration": round(dur, 2), "stringIndex": int(t) % 6, "correct": True })
+        t += dur
+    return y, truth
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+def _timed(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        runs.append(time.perf_counter() - start)
+    return out, round(min(runs), 4), round(float(np.median(runs)), 4)
+
+# 📊 Time every stage for one clip length
+def run_case(seconds, repeat, params):
+    import soundfile as sf
+
+    params = predict.resolve_params(params)
+    sr, hop = params["sr"], params["hop"]
+
+    # Warm up numba/FFT caches so the first stage isn't charged for JIT compilation
+    predict.compute_chroma(synthesize(3, sr)[0], params)
+
+    y, truth = synthesize(seconds, sr, seed=int(seconds))
+    with tempfile.TemporaryDirectory() as tmp:
+        wav = os.path.join(tmp, "clip.wav")
+        sf.write(wav, y, sr, subtype="PCM_16")
+        stages = {}
+        (y, _), *stages["decode"] = _timed(lambda: load_audio(wav, sr), repeat)
+
+    chroma, *stages["chroma"] = _timed(lambda: predict.compute_chroma(y, params), repeat)
+    labels, *stages["match"] = _timed(lambda: predict.decode_frames(chroma, params), repeat)
+    # Share of frames labelled like the default front-end (cqt with tuning) on the same clip
+    reference = predict.resolve_params({ "hop": hop })
+    same = (params["chroma"], params["tuning"]) == (reference["chroma"], reference["tuning"])
+    agreement = 1.0 if same else float(np.mean(labels == predict.decode_frames(predict.compute_chroma(y, reference), reference)))
+    times = np.arange(chroma.shape[1]) * hop / sr
+    end = times[-1]
+    labels = predict.merge_short_runs(labels, times, end, params["min_duration"])
+    chords, *stages["segment"] = _timed(lambda: predict.segment_labels(labels, times, end), repeat)
+    _, *stages["compare"] = _timed(lambda: predict.compare_chords(truth, chords), repeat)
+
+    return {
+        "seconds": seconds,
+        "chroma": params["chroma"],
+        "hop": hop,
+        "frames": int(chroma.shape[1]),
+        "segments": len(chords),
+        "agreement": round(agreement, 3),
+        "stages": { name: { "min": t[0], "median": t[1] } for name, t in stages.items() },
+        "peakRssMb": _peak_rss_mb(),
+    }
+
+def _case_entry(queue, seconds, repeat, params):
+    try:
+        queue.put(run_case(seconds, repeat, params))
+    except Exception as err:
+        queue.put({ "seconds": seconds, "error": f"{type(err).__name__}: {err}" })
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark predict.py stages on synthetic audio")
+    parser.add_argument("--lengths", type=float, nargs="+", default=DEFAULT_LENGTHS, help="clip lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage (min and median are reported)")
+    parser.add_argument("--chroma", choices=predict.CHROMA_MODES, default="cqt")
+    parser.add_argument("--hop", type=int, default=predict.HOP)
+    parser.add_argument("--n-fft", type=int, help="STFT window for --chroma stft (default: predict's)")
+    parser.add_argument("--no-tuning", action="store_true", help="assume A440 instead of estimating tuning")
+    parser.add_argument("--out", help="also append the JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    params = { "chroma": args.chroma, "hop": args.hop, "tuning": not args.no_tuning }
+    if args.n_fft:
+        params["n_fft"] = args.n_fft
+    ctx = multiprocessing.get_context("spawn")
+    out = open(args.out, "a") if args.out else None
+    for seconds in args.lengths:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_case_entry, args=(queue, seconds, args.repeat, params))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        line = json.dumps(result)
+        print(line, flush=True)
+        if out:
+            out.write(line + "\n")
+    if out:
+        out.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+
+# 🗂️ On-disk cache of extract_chords results, keyed by audio content + analysis params
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PREDICT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("PREDICT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# 🔑 SHA-256 of the file contents (streamed, so large uploads stay cheap on memory)
+def file_digest(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def params_digest(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ChordCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, audio_path, params):
+        return f"{file_digest(audio_path)}-{params_digest(params)}"
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key + ext)
+
+    # 📥 Cached chords (and chroma when stored) or None; a hit refreshes the entry's LRU position
+    def get(self, key, with_chroma=False):
+        import numpy as np
+
+        path = self._path(key, ".json")
+        try:
+            with open(path) as f:
+                chords = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        if not with_chroma:
+            return chords, None
+        try:
+            chroma = np.load(self._path(key, ".npy"))
+        except (OSError, ValueError):
+            return None
+        return chords, chroma
+
+    # 📈 Pitch curve stored with an entry, or None
+    def get_curve(self, key):
+        try:
+            with open(self._path(key, ".pitch.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # 📤 Store atomically so concurrent workers never read a half-written entry
+    def put(self, key, chords, chroma=None, curve=None):
+        import numpy as np
+
+        if chroma is not None:
+            tmp = self._path(key, f".{os.getpid()}.tmp.npy")
+            np.save(tmp, chroma.astype(np.float32))
+            os.replace(tmp, self._path(key, ".npy"))
+        if curve is not None:
+            tmp = self._path(key, f".pitch.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(curve, f)
+            os.replace(tmp, self._path(key, ".pitch.json"))
+
+        tmp = self._path(key, f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(chords, f)
+        os.replace(tmp, self._path(key, ".json"))
+        self.evict()
+
+    # 🧹 Drop least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = {}
+        total = 0
+        for name in os.listdir(self.root):
+            if ".tmp" in name:
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            stem = name.split(".", 1)[0]
+            size, mtime = entries.get(stem, (0, 0))
+            entries[stem] = (size + st.st_size, max(mtime, st.st_mtime))
+            total += st.st_size
+
+        for stem, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(stem)
+            total -= size
+
+    def _remove(self, stem):
+        for ext in (".json", ".npy", ".pitch.json"):
+            try:
+                os.remove(self._path(stem, ext))
+            except OSError:
+                pass
+
+    # ❌ Invalidate every entry for one audio file, or the whole cache when no path is given
+    def invalidate(self, audio_path=None):
+        prefix = file_digest(audio_path) if audio_path else ""
+        stems = {
+            name.split(".", 1)[0]
+            for name in os.listdir(self.root)
+            if name.startswith(prefix) and ".tmp" not in name
+        }
+        for stem in stems:
+            self._remove(stem)
+        return len(stems)
@@ -0,0 +1,65 @@
+import os
+import json
+
+from chord_cache import file_digest
+
+# 💾 Persistent per-recording features: <sha256>.npy (float32 chroma), one <sha256>.<name>.npy per
+# extra frame-level array (e.g. rms), and a <sha256>.json sidecar. Unlike the LRU chord cache nothing
+# is evicted, so stored sessions can be re-scored with new templates or thresholds without decoding
+# the audio again.
+DEFAULT_FEATURE_DIR = os.environ.get(
+    "PREDICT_FEATURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "features")
+)
+
+
+def _array_path(base, name):
+    return base + (".npy" if name == "chroma" else f".{name}.npy")
+
+def _save_array(path, array):
+    import numpy as np
+
+    tmp = path[:-len(".npy")] + f".{os.getpid()}.tmp.npy"
+    np.save(tmp, np.ascontiguousarray(array, dtype=np.float32))
+    os.replace(tmp, path)
+
+# 📤 Write every array in `features` (must include "chroma") + sidecar atomically; returns the .npy path
+def save_features(store_dir, audio_path, features, meta, digest=None):
+    os.makedirs(store_dir, exist_ok=True)
+    digest = digest or file_digest(audio_path)
+    base = os.path.join(store_dir, digest)
+    for name, array in features.items():
+        _save_array(_array_path(base, name), array)
+
+    sidecar = {
+        **meta,
+        "hash": digest,
+        "frames": int(features["chroma"].shape[-1]),
+        "arrays": sorted(features),
+        "source": os.path.basename(audio_path),
+    }
+    tmp = base + f".json.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(sidecar, f)
+    os.replace(tmp, base + ".json")
+    return base + ".npy"
+
+# 📥 Memory-mapped arrays + sidecar from a chroma .npy path; resident memory stays flat while scanning
+def load_feature_file(npy_path):
+    import numpy as np
+
+    base = npy_path[:-len(".npy")]
+    with open(base + ".json") as f:
+        meta = json.load(f)
+    features = { name: np.load(_array_path(base, name), mmap_mode="r") for name in meta.get("arrays", ["chroma"]) }
+    return features, meta
+
+# 🔎 Stored features for an audio file, or None if missing or computed with other parameters
+def load_features(store_dir, audio_path, expect=None, digest=None):
+    npy_path = os.path.join(store_dir, (digest or file_digest(audio_path)) + ".npy")
+    try:
+        features, meta = load_feature_file(npy_path)
+    except (OSError, ValueError):
+        return None
+    if expect and any(meta.get(k) != v for k, v in expect.items()):
+        return None
+    return features, meta
@@ -0,0 +1,109 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+# 🗃️ Persistent analysis queue: one SQLite file shared by submitters (CLI, Node) and the
+# server's scheduler, so queued work survives restarts and identical submissions share a job
+DEFAULT_QUEUE_PATH = os.environ.get("PREDICT_QUEUE_DB") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".queue", "jobs.sqlite3")
+STATUSES = ("queued", "running", "done", "failed")
+RETENTION_SECONDS = float(os.environ.get("PREDICT_QUEUE_RETENTION_HOURS", 24)) * 3600  # finished jobs kept this long
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    status TEXT NOT NULL,
+    job TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class JobQueue:
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    # One short-lived autocommit connection per call: safe across threads and processes
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # ➕ Queue a job under a dedup key; an existing queued/running/done job with the same key
+    # is returned instead, and a failed one is queued again. Returns (id, deduplicated).
+    def submit(self, job, key):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id, status FROM jobs WHERE key = ?", (key,)).fetchone()
+            if row is not None and row["status"] != "failed":
+                db.execute("COMMIT")
+                return row["id"], True
+            job_id = uuid.uuid4().hex
+            if row is not None:
+                db.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+            db.execute("INSERT INTO jobs (id, key, status, job, created) VALUES (?, ?, 'queued', ?, ?)",
+                       (job_id, key, json.dumps(job), time.time()))
+            db.execute("COMMIT")
+        return job_id, False
+
+    # 🔎 Status (and result or error once finished) of one job, None for unknown ids
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        entry = { "jobId": row["id"], "status": row["status"], "created": row["created"], "started": row["started"], "finished": row["finished"] }
+        if row["result"] is not None:
+            entry["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            entry["error"] = row["error"]
+        return entry
+
+    # 🎟️ Atomically take the oldest queued job; returns (id, job) or None
+    def claim(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT id, job FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row["id"]))
+            db.execute("COMMIT")
+        return None if row is None else (row["id"], json.loads(row["job"]))
+
+    # ✅ Store the outcome; error results mark the job failed so a resubmission retries it
+    def finish(self, job_id, result):
+        status, error = ("failed", result["error"]) if "error" in result else ("done", None)
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                       (status, json.dumps(result), error, time.time(), job_id))
+
+    # 🔁 Jobs left running by a scheduler that died go back to the queue
+    def requeue_running(self):
+        with self._connect() as db:
+            return db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'").rowcount
+
+    # 🧹 Drop finished (done or failed) jobs older than `older_than` seconds; returns how many
+    def purge(self, older_than=RETENTION_SECONDS):
+        with self._connect() as db:
+            return db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                              (time.time() - older_than,)).rowcount
+
+    def counts(self):
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return { **dict.fromkeys(STATUSES, 0), **{ row["status"]: row["n"] for row in rows } }
@@ -0,0 +1,72 @@
+import sys
+import time
+import resource
+from contextlib import contextmanager
+
+# 📈 Opt-in per-stage instrumentation: wall/CPU seconds per stage, counters and peak RSS.
+# Pipelines take `metrics=None` and fall back to NULL_METRICS, so the default path stays free.
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Metrics:
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, { "wall": 0.0, "cpu": 0.0, "calls": 0 })
+            entry["wall"] += time.perf_counter() - wall
+            entry["cpu"] += time.process_time() - cpu
+            entry["calls"] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def as_dict(self):
+        return {
+            "stages": {
+                name: { "wall": round(s["wall"], 4), "cpu": round(s["cpu"], 4), "calls": s["calls"] }
+                for name, s in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            # Process-wide high-water mark; for a long-lived server worker this spans earlier jobs too
+            "peakRssBytes": peak_rss_bytes(),
+        }
+
+
+class _NullMetrics:
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, n=1):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
+
+# 📝 Prometheus text exposition of a Metrics.as_dict() block
+def prometheus_text(block, prefix="predict"):
+    lines = [
+        f"# HELP {prefix}_stage_wall_seconds Wall-clock seconds spent per analysis stage",
+        f"# TYPE {prefix}_stage_wall_seconds gauge",
+    ]
+    lines += [f'{prefix}_stage_wall_seconds{{stage="{n}"}} {s["wall"]}' for n, s in block["stages"].items()]
+    lines += [
+        f"# HELP {prefix}_stage_cpu_seconds CPU seconds spent per analysis stage",
+        f"# TYPE {prefix}_stage_cpu_seconds gauge",
+    ]
+    lines += [f'{prefix}_stage_cpu_seconds{{stage="{n}"}} {s["cpu"]}' for n, s in block["stages"].items()]
+    for name, value in block["counters"].items():
+        lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+    lines += [f"# TYPE {prefix}_peak_rss_bytes gauge", f"{prefix}_peak_rss_bytes {block['peakRssBytes']}"]
+    return "\n".join(lines) + "\n"
@@ -1,82 +1,991 @@
+import os
 import sys
 import json
-import librosa
-import numpy as np
-
-# 🎹 Chord Templates (12-note chroma vectors)
-CHORD_TEMPLATES = {
-    "C":    [1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0],
-    "Cm":   [1, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0],
-    "D":    [0, 1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0],
-    "Dm":   [0, 1, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0],
-    "E":    [0, 0, 1, 0, 0, 0, 1, 0, 0, 1, 0, 0],
-    "Em":   [0, 0, 1, 0, 1, 0, 0, 0, 0, 1, 0, 0],
-    "F":    [1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0],
-    "G":    [0, 0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 0],
-    "A":    [0, 1, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0],
-    "Am":   [0, 1, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0],
-    "B":    [0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0],
-    "Bm":   [0, 0, 1, 0, 0, 1, 0, 0, 0, 0, 1, 0],
+import sqlite3
+import signal
+import socket
+import argparse
+import tempfile
+import time
+import threading
+import cProfile
+import socketserver
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from audio_io import load_audio, iter_audio, decoded_bytes, RES_TYPE, DECODE_CAP_BYTES
+from chord_cache import ChordCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, file_digest, params_digest
+from feature_store import DEFAULT_FEATURE_DIR, save_features, load_features, load_feature_file
+from job_queue import JobQueue, DEFAULT_QUEUE_PATH
+from reference_index import ReferenceIndex, DEFAULT_REFERENCE_DIR
+from metrics import Metrics, NULL_METRICS, prometheus_text
+from result_format import FORMATS, encode
+from session_stats import session_stats, aggregate_stats, read_stats
+
+# 📦 Stable library API: import predict and call these in-process instead of spawning the CLI
+__all__ = [
+    "extract_chords", "extract_track", "compare_chords", "grade_session", "detect_transposition", "build_summary", "session_stats", "aggregate_stats",
+    "ingest_reference", "analyse_audio", "chunk_features", "StreamingChordExtractor", "resolve_params", "DEFAULT_PARAMS", "run_job", "main",
+]
+
+# 💤 numpy (and librosa, imported inside the functions that need it) load on first use, so
+# importing this module, --help and argument errors stay in the milliseconds
+class _LazyNumpy:
+    def __getattr__(self, name):
+        import numpy
+
+        globals()["np"] = numpy
+        return getattr(numpy, name)
+
+np = _LazyNumpy()
+
+# 🔌 Where the persistent analysis server listens (see serve())
+SOCKET_PATH = os.environ.get(
+    "PREDICT_SOCKET", os.path.join(tempfile.gettempdir(), "aaroh-predict.sock")
+)
+SERVER_TIMEOUT_SECONDS = float(os.environ.get("PREDICT_SERVER_TIMEOUT", 120))  # a hung server counts as unreachable
+
+# 👷 Worker processes when none are asked for: the CPUs this process may run on, capped low
+# because every worker holds its own librosa/numpy heap; PREDICT_WORKERS overrides
+MAX_DEFAULT_WORKERS = 2
+
+def default_workers():
+    if os.environ.get("PREDICT_WORKERS"):
+        return max(int(os.environ["PREDICT_WORKERS"]), 1)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return max(min(cpus, MAX_DEFAULT_WORKERS), 1)
+
+# 🎹 Chord templates (12-note chroma vectors), generated from roots x interval sets
+ROOTS = ["C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+CHORD_QUALITIES = {
+    "": (0, 4, 7),  # major
+    "m": (0, 3, 7),
+    "7": (0, 4, 7, 10),
+    "maj7": (0, 4, 7, 11),
+    "m7": (0, 3, 7, 10),
+    "sus2": (0, 2, 7),  # same pitch classes as sus4 a fifth up; the sus2 name wins the tie
+    "sus4": (0, 5, 7),
+    "5": (0, 7),  # power chord
+    "dim": (0, 3, 6),
+}
+TEMPLATE_SETS = {
+    "triads": ("", "m"),  # 24 major/minor chords, the default
+    "extended": tuple(CHORD_QUALITIES),  # 108 chords; more choice means more confusions on noisy takes
 }
 
-# 🧠 Match a chroma vector to a chord template
-def match_chord(chroma_column):
-    scores = {}
-    for chord, template in CHORD_TEMPLATES.items():
-        scores[chord] = np.dot(chroma_column, template)
-    return max(scores, key=scores.get)
+def chord_templates(qualities):
+    return { root + q: [int((pc - r) % 12 in CHORD_QUALITIES[q]) for pc in range(12)] for r, root in enumerate(ROOTS) for q in qualities }
+
+# 🧮 Each set compiled once, on first use, into chord names + one unit-norm (n_chords x 12) matrix
+@lru_cache(maxsize=None)
+def template_bank(name="triads"):
+    templates = chord_templates(TEMPLATE_SETS[name])
+    matrix = np.array(list(templates.values()), dtype=np.float32)
+    return list(templates), matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+CHORD_TEMPLATES = chord_templates(TEMPLATE_SETS["triads"])
+CHORD_NAMES = list(CHORD_TEMPLATES)
+NO_CHORD = "N"  # label of gated (silent) regions; frame label -1
+
+# 🗝️ Krumhansl-Kessler key profiles, z-scored and rotated to all 24 keys once (major rows first)
+_KEY_PROFILES = [
+    [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88],
+    [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17],
+]
+KEY_NAMES = [f"{root} {mode}" for mode in ("major", "minor") for root in ROOTS]
+
+@lru_cache(maxsize=None)
+def key_matrix():
+    matrix = np.array([np.roll(profile, r) for profile in _KEY_PROFILES for r in range(12)])
+    return (matrix - matrix.mean(axis=1, keepdims=True)) / matrix.std(axis=1, keepdims=True)
+
+# 🔀 (quality index, root index) of every chord name a template set can produce
+CHORD_PARTS = { root + q: (k, r) for k, q in enumerate(CHORD_QUALITIES) for r, root in enumerate(ROOTS) }
+
+ONSET_RATIO = 4  # onset frames per chroma frame (512-sample onset hop at the default hop)
+CHUNK_SECONDS = 60.0  # window length of chunk-parallel extraction (--chunk-workers)
+TUNING_SECONDS = 60.0  # opening audio that fixes tuning when a file is analysed block by block
+PCM_CHUNK_EXT = ".f32"  # session chunks written by the mic pipeline: raw f32le mono at the analysis rate
+DEFAULT_CHUNK_DIR = os.path.join(DEFAULT_FEATURE_DIR, "chunks")  # per-chunk partial features
+
+# 🎛️ Analysis parameters; anything that changes the output belongs here (it keys the cache)
+SR = 22050  # ✅ Faster sample rate
+HOP = 2048  # ✅ Less frequent feature extraction
+
+DEFAULT_PARAMS = {
+    "sr": SR,
+    "hop": HOP,
+    "resample": RES_TYPE,
+    "chroma": "cqt",  # chroma front-end, one of CHROMA_MODES
+    "n_fft": 4096,  # analysis window of the "stft" front-end
+    "tuning": True,  # estimate tuning per track; False assumes A440
+    "gate": True,  # report quiet frames as rests instead of classifying them
+    "gate_db": -40.0,  # frames this far below the loudest frame are rests...
+    "gate_floor_db": -60.0,  # ...and so is anything under this absolute level (dBFS)
+    "beat_sync": False,  # classify one aggregated chroma column per beat instead of per frame
+    "subdivide": 1,  # with beat_sync, columns per beat (2 = eighth notes in 4/4)
+    "templates": "triads",  # chord vocabulary, one of TEMPLATE_SETS
+    "smooth": "viterbi",  # frame decoder, one of SMOOTHING_MODES
+    "switch_prob": 0.05,  # viterbi: prior probability of a chord change between frames
+    "median_width": 9,  # median: score filter length in frames
+    "min_duration": 0.25,  # segments shorter than this (seconds) merge into their neighbour
+    "transpose": True,  # compare: grade a take played in another key (capo) as if played in the ideal's
+    "pitch": "off",  # pitch tracker run in the chroma pass, one of PITCH_MODES
+}
 
-# 🎸 Extract chords using template matching (✅ Optimized)
-def extract_chords(audio_path):
-    y, sr = librosa.load(audio_path, sr=22050)  # ✅ Faster sample rate
-    hop = 2048  # ✅ Less frequent feature extraction
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop)
-    times = librosa.frames_to_time(range(chroma.shape[1]), sr=sr, hop_length=hop)
+SMOOTHING_MODES = ("viterbi", "median", "none")
+SCORE_SHARPNESS = 20.0  # cosine scores -> log-likelihoods; higher trusts single frames more
+
+# 🎚️ Chroma front-ends. Chroma time on a 3 min synthetic triad take (hop 2048, one core, best
+# of 3) and the share of frames the Viterbi decoder labels like the cqt default, from
+# `benchmark.py --lengths 180 --chroma <mode> [--no-tuning]`:
+#   cqt               0.90 s   reference, used for final grading
+#   cqt  --no-tuning  0.33 s  100%  (the take is at A440; tuning estimation is most of the cqt cost)
+#   stft              0.29 s   99%  coarse bass resolution; fine for live "which chord now" hints
+#   stft --no-tuning  0.21 s   98%  (n_fft 8192)
+#   cens              0.70 s   86%  cqt + 41-frame smoothing; steadier, blurs fast changes
+CHROMA_MODES = ("cqt", "stft", "cens")
+
+# 🎵 Pitch tracking on the chroma frame grid. yin is cheap and frame-local, so chunked and
+# streamed analysis match a whole-file pass; pyin adds a voicing decision and an HMM over
+# each analysed window (more stable, several times slower).
+PITCH_MODES = ("off", "yin", "pyin")
+PITCH_FMIN = 65.4  # C2, below a guitar's low E
+PITCH_FMAX = 1318.5  # E6
+PITCH_FRAME = 2048  # samples per pitch frame, centred like the chroma frames
+PITCH_POINTS = 512  # most points a stored pitch curve keeps
+PITCH_TOLERANCE = 50  # cents a played segment may sit off the ideal's and still count as in tune
+
+def resolve_params(params=None):
+    return { **DEFAULT_PARAMS, **(params or {}) }
+
+# Parameters the chroma itself depends on (what a stored feature file must match)
+def feature_params(params=None):
+    params = resolve_params(params)
+    keys = ["sr", "hop", "resample", "chroma", "tuning"] + (["n_fft"] if params["chroma"] == "stft" else [])
+    if params["pitch"] != "off":
+        keys += ["pitch"]
+    if params["beat_sync"]:
+        keys += ["beat_sync", "subdivide"]
+    return { k: params[k] for k in keys }
+
+def analysis_params(params=None):
+    params = resolve_params(params)
+    return {
+        **feature_params(params),
+        **{ k: params[k] for k in ("gate", "gate_db", "gate_floor_db", "smooth", "switch_prob", "median_width", "min_duration") },
+        "templates": {name: row.round(6).tolist() for name, row in zip(*template_bank(params["templates"]))},
+    }
 
-    chords = []
-    last_chord = None
-    start_time = 0
+# 🗝️ Most likely key of a chroma matrix: correlation of its mean profile with every key profile
+def estimate_key(chroma):
+    profile = np.asarray(chroma).mean(axis=1)
+    profile = (profile - profile.mean()) / max(profile.std(), 1e-9)
+    scores = key_matrix() @ profile / 12
+    best = int(np.argmax(scores))
+    return { "key": KEY_NAMES[best], "confidence": round(float(scores[best]), 3) }
 
-    for i, t in enumerate(times):
-        chord = match_chord(chroma[:, i])
-        if chord != last_chord:
-            if last_chord is not None:
-                chords.append({
-                    "chord": last_chord,
-                    "start": round(start_time, 2),
-                    "duration": round(t - start_time, 2),
-                    "stringIndex": int(start_time) % 6,
-                    "correct": True
-                })
-            last_chord = chord
-            start_time = t
+# 🧠 Match a chroma vector to a chord template
+def match_chord(chroma_column):
+    names, matrix = template_bank()
+    return names[int(np.argmax(matrix @ chroma_column))]
+
+# ⚡ Best template index for every chroma frame: one matmul + argmax
+def match_frames(chroma, matrix=None):
+    matrix = template_bank()[1] if matrix is None else matrix
+    return np.argmax(matrix @ chroma, axis=0)
+
+# 🏷️ One chord segment in the shape the Node side expects
+def _segment(idx, start, end, names=CHORD_NAMES):
+    start = float(start)
+    return {
+        "chord": names[idx] if idx >= 0 else NO_CHORD,
+        "start": round(start, 2),
+        "duration": round(float(end) - start, 2),
+        "stringIndex": int(start) % 6,
+        "correct": True
+    }
 
-    if last_chord is not None:
-        chords.append({
-            "chord": last_chord,
-            "start": round(start_time, 2),
-            "duration": round(times[-1] - start_time, 2),
-            "stringIndex": int(start_time) % 6,
-            "correct": True
-        })
+# 📐 Cosine similarity of every template against every frame (templates x frames)
+def frame_scores(chroma, matrix=None):
+    matrix = template_bank()[1] if matrix is None else matrix
+    chroma = np.asarray(chroma, dtype=np.float32)
+    return (matrix @ chroma) / np.maximum(np.linalg.norm(chroma, axis=0), 1e-9)
+
+# 🧭 Viterbi decode under a uniform switch prior: staying costs log(1 - p), moving to any
+# other chord log(p / (K - 1)). That structure makes each step O(K) instead of O(K^2).
+# `init` carries the last column's path scores across calls (streaming); returns (path, last).
+def viterbi_decode(scores, switch_prob, init=None):
+    n_states, n = scores.shape
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), init
+    stay = np.log1p(-switch_prob)
+    move = np.log(switch_prob / max(n_states - 1, 1))
+    loglik = SCORE_SHARPNESS * scores
+    delta = loglik[:, 0] if init is None else loglik[:, 0] + np.maximum(init + stay, init.max() + move)
+    best = np.empty(n, dtype=np.int64)
+    kept = np.empty((n, n_states), dtype=bool)
+    for t in range(1, n):
+        best[t] = delta.argmax()
+        kept[t] = delta + stay >= delta[best[t]] + move
+        delta = loglik[:, t] + np.where(kept[t], delta + stay, delta[best[t]] + move)
+    path = np.empty(n, dtype=np.int64)
+    path[-1] = delta.argmax()
+    for t in range(n - 1, 0, -1):
+        path[t - 1] = path[t] if kept[t, path[t]] else best[t]
+    return path, delta - delta.max()
+
+# 🪢 Template index per column with the configured smoothing
+def decode_frames(chroma, params, state=None):
+    matrix = template_bank(params["templates"])[1]
+    if params["smooth"] == "viterbi":
+        state = {} if state is None else state
+        path, state["delta"] = viterbi_decode(frame_scores(chroma, matrix), params["switch_prob"], state.get("delta"))
+        return path
+    if params["smooth"] == "median" and chroma.shape[1] > 1:
+        from scipy.ndimage import median_filter
+
+        return np.argmax(median_filter(frame_scores(chroma, matrix), size=(1, params["median_width"]), mode="nearest"), axis=0)
+    return match_frames(chroma, matrix)
+
+# 🧹 Relabel runs shorter than min_duration with the preceding long run (the first long run
+# for leading ones). Columns may be uneven (beat-sync), so lengths are measured in seconds.
+def merge_short_runs(labels, times, end, min_duration):
+    if len(labels) == 0 or min_duration <= 0:
+        return labels
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+    lengths = np.diff(np.append(times[starts], end))
+    long_runs = np.flatnonzero(lengths >= min_duration)
+    if len(long_runs) == 0 or len(long_runs) == len(starts):
+        return labels
+    owner = np.where(lengths >= min_duration, np.arange(len(starts)), -1)
+    owner = np.maximum.accumulate(owner)
+    owner[owner < 0] = long_runs[0]
+    run_labels = labels[starts][owner]
+    return np.repeat(run_labels, np.diff(np.append(starts, len(labels))))
+
+# ✂️ Run-length encode frame labels into chord segments; the last one ends at `end` (default: last time)
+def segment_labels(labels, times, end=None, names=CHORD_NAMES):
+    if len(labels) == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+    ends = np.append(times[starts[1:]], times[-1] if end is None else end)
+    return [_segment(idx, start, end, names) for idx, start, end in zip(labels[starts], times[starts], ends)]
+
+# 🔇 Frame loudness in dBFS on the chroma frame grid
+def frame_db(y, params):
+    import librosa
+
+    rms = librosa.feature.rms(y=y, frame_length=2 * params["hop"], hop_length=params["hop"])[0]
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+# 🥁 Onset strength for beat tracking, ONSET_RATIO frames per chroma frame (the chroma hop is
+# too coarse for a stable tempo estimate)
+def onset_envelope(y, params):
+    import librosa
+
+    return librosa.onset.onset_strength(y=y, sr=params["sr"], hop_length=params["hop"] // ONSET_RATIO)
+
+# 🥁 Beat (or sub-beat) positions as chroma frame indices from an onset envelope
+def beats_from_onsets(env, params):
+    import librosa
+
+    _, beats = librosa.beat.beat_track(onset_envelope=env, sr=params["sr"], hop_length=params["hop"] // ONSET_RATIO)
+    beats = beats / ONSET_RATIO
+    if params["subdivide"] > 1 and len(beats) > 1:
+        steps = np.arange(params["subdivide"]) / params["subdivide"]
+        beats = np.append((beats[:-1, None] + np.diff(beats)[:, None] * steps).ravel(), beats[-1])
+    return np.unique(np.round(beats).astype(np.int64))
+
+# 🥁 Beat positions of one signal; tracked once per track
+def beat_frames(y, params):
+    return beats_from_onsets(onset_envelope(y, params), params)
+
+# 🎼 Frame-level features for one signal: chroma plus loudness for gating (and beats when synced,
+# f0 when pitch tracking is on)
+def compute_features(y, params, tuning=None):
+    features = { "chroma": compute_chroma(y, params, tuning), "rms": frame_db(y, params) }
+    if params["pitch"] != "off":
+        features["f0"] = track_pitch(y, params)
+    if params["beat_sync"]:
+        features["beats"] = beat_frames(y, params)
+    return features
+
+# 🎵 Fundamental per frame (Hz), NaN where pyin finds no voicing. yin has no voicing decision
+# of its own; gated frames are dropped later (voiced_f0) for both trackers.
+def track_pitch(y, params):
+    import librosa
+
+    options = { "fmin": PITCH_FMIN, "fmax": PITCH_FMAX, "sr": params["sr"], "frame_length": PITCH_FRAME, "hop_length": params["hop"] }
+    if params["pitch"] == "pyin":
+        return librosa.pyin(y, **options)[0]
+    return librosa.yin(y, **options)
+
+# 🔇 A track's f0 with gated (quiet) frames set to NaN
+def voiced_f0(features, params):
+    f0 = np.array(features["f0"], dtype=np.float64)
+    if "rms" in features:
+        f0[~gate_frames(np.asarray(features["rms"]), params)] = np.nan
+    return f0
+
+# 📈 Pitch curve for storage: frames are grouped into at most max_points bins, each reported at
+# its centre with the median voiced f0; bins without a voiced frame are left out
+def pitch_curve(features, params, max_points=PITCH_POINTS):
+    import warnings
+
+    f0 = voiced_f0(features, params)
+    step = max(1, -(-len(f0) // max_points))
+    bins = np.full(-(-len(f0) // step) * step, np.nan)
+    bins[:len(f0)] = f0
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN bins
+        freq = np.nanmedian(bins.reshape(-1, step), axis=1)
+    times = (np.arange(len(freq)) * step + (step - 1) / 2) * params["hop"] / params["sr"]
+    return [{ "time": round(float(t), 2), "freq": round(float(f), 1) } for t, f in zip(times, freq) if not np.isnan(f)]
+
+# 🎵 Median voiced f0 (Hz) of every chord segment, None where nothing in it was voiced
+def add_segment_pitch(chords, features, params):
+    import warnings
+
+    f0 = voiced_f0(features, params)
+    frames_per_second = params["sr"] / params["hop"]
+    for c in chords:
+        lo = int(round(c["start"] * frames_per_second))
+        hi = max(lo + 1, int(round((c["start"] + c["duration"]) * frames_per_second)))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN segments
+            pitch = np.nanmedian(f0[lo:hi]) if lo < len(f0) else np.nan
+        c["pitch"] = None if c["chord"] == NO_CHORD or np.isnan(pitch) else round(float(pitch), 1)
+    return chords
 
+# 🪄 Aggregate frame features per beat: median chroma, mean loudness. Returns the synced
+# features and the first frame of each column, so segments still map back to seconds.
+def beat_sync_features(features, params):
+    import librosa
+
+    n_frames = features["chroma"].shape[1]
+    bounds = librosa.util.fix_frames(np.asarray(features["beats"], dtype=np.int64), x_min=0, x_max=n_frames)
+    synced = { "chroma": librosa.util.sync(np.asarray(features["chroma"]), bounds, aggregate=np.median) }
+    if "rms" in features:
+        synced["rms"] = librosa.util.sync(np.asarray(features["rms"]), bounds, aggregate=np.mean)
+    return synced, bounds[:-1]
+
+# 🎼 Chroma for one signal with the configured front-end; a fixed `tuning` overrides estimation
+def compute_chroma(y, params, tuning=None):
+    import librosa
+
+    sr, hop = params["sr"], params["hop"]
+    if tuning is None and not params["tuning"]:
+        tuning = 0.0
+    if params["chroma"] == "stft":
+        return librosa.feature.chroma_stft(y=y, sr=sr, hop_length=hop, n_fft=params["n_fft"], tuning=tuning)
+    if params["chroma"] == "cens":
+        return librosa.feature.chroma_cens(y=y, sr=sr, hop_length=hop, tuning=tuning)
+    return librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop, tuning=tuning)
+
+# 🎯 The tuning estimate compute_chroma would make for `y` on its own, in that front-end's bin units
+def estimate_tuning(y, params):
+    import librosa
+
+    if not params["tuning"]:
+        return 0.0
+    if params["chroma"] == "stft":
+        return librosa.estimate_tuning(y=y, sr=params["sr"], n_fft=params["n_fft"])
+    return librosa.estimate_tuning(y=y, sr=params["sr"], bins_per_octave=36)  # chroma_cqt's CQT resolution
+
+# 🎯 An estimate_tuning value in cents off A440 (cqt/cens estimates are relative to the nearest
+# third of a semitone, the CQT bin, so they wrap at ±16.7 cents)
+def tuning_cents(tuning, params):
+    return tuning * 100 / (1 if params["chroma"] == "stft" else 3)
+
+# 📏 Audio (in samples, a multiple of hop) a frame needs on each side to match a whole-file chroma
+def chroma_context(params):
+    sr, hop = params["sr"], params["hop"]
+    if params["chroma"] == "stft":
+        reach = params["n_fft"] // 2
+    else:
+        reach = int(0.85 * sr)  # half the longest CQT filter at C1
+        if params["chroma"] == "cens":
+            reach += 20 * hop  # CENS smooths over 41 frames
+    return -(-reach // hop) * hop
+
+# 🧩 Worker side of chunk-parallel features: frames [first, stop) computed from a padded window
+def _chunk_features(window, lo, first, stop, params, tuning):
+    import warnings
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # a short last window trips librosa's n_fft warning
+        features = compute_features(window, params, tuning)
+    base = lo // params["hop"]
+    return { name: f[..., first - base:stop - base] for name, f in features.items() }
+
+# 🧩 Chunk-parallel features for long recordings: frames are split into chunk_seconds blocks,
+# each computed on a window padded by chroma_context() with one whole-track tuning estimate,
+# then concatenated. Seams are stitched at frame level, before decoding, so they can never
+# split or duplicate a chord. Beats still need the whole signal and are tracked here.
+# The track's tuning estimate comes back as the scalar "tuning" feature.
+def compute_features_chunked(y, params, workers, chunk_seconds=CHUNK_SECONDS):
+    hop = params["hop"]
+    n_frames = 1 + len(y) // hop
+    step = max(1, int(chunk_seconds * params["sr"]) // hop)
+    tuning = estimate_tuning(y, params)
+    if workers <= 1 or n_frames <= step:
+        return { **compute_features(y, params, tuning), "tuning": np.array(tuning, dtype=np.float32) }
+
+    context = chroma_context(params)
+    chunk_params = { **params, "beat_sync": False }
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for first in range(0, n_frames, step):
+            stop = min(first + step, n_frames)
+            lo = max(0, first * hop - context)
+            hi = min(len(y), (stop - 1) * hop + context)
+            futures.append(pool.submit(_chunk_features, y[lo:hi], lo, first, stop, chunk_params, tuning))
+        chunks = [future.result() for future in futures]
+
+    features = { name: np.concatenate([c[name] for c in chunks], axis=-1) for name in chunks[0] }
+    if params["beat_sync"]:
+        features["beats"] = beat_frames(y, params)
+    features["tuning"] = np.array(tuning, dtype=np.float32)
+    return features
+
+# 🚪 Mask of frames loud enough to classify; `peak_db` defaults to the loudest frame given
+def gate_frames(db, params, peak_db=None):
+    if not params["gate"] or len(db) == 0:
+        return np.ones(len(db), dtype=bool)
+    peak_db = db.max() if peak_db is None else peak_db
+    return db >= max(peak_db + params["gate_db"], params["gate_floor_db"])
+
+# 🏷️ Template index per frame, -1 for gated frames; only active frames are matched.
+# `state` carries the decoder between calls when frames arrive in blocks.
+def label_frames(features, params, metrics=None, peak_db=None, state=None):
+    metrics = metrics or NULL_METRICS
+    chroma = features["chroma"]
+    with metrics.stage("gate"):
+        active = gate_frames(features["rms"], params, peak_db) if "rms" in features else np.ones(chroma.shape[1], dtype=bool)
+    metrics.count("gated_frames", len(active) - active.sum())
+    labels = np.full(chroma.shape[1], -1, dtype=np.int64)
+    with metrics.stage("match"):
+        labels[active] = decode_frames(chroma[:, active], params, state)
+    return labels
+
+# 🎼 Frame features -> chord segments (gated regions become NO_CHORD rests)
+def chords_from_features(features, params, metrics=None):
+    metrics = metrics or NULL_METRICS
+    n_frames = features["chroma"].shape[1]
+    metrics.count("frames", n_frames)
+    columns = np.arange(n_frames)
+    frames = features
+    if params["beat_sync"] and "beats" in features:
+        with metrics.stage("sync"):
+            features, columns = beat_sync_features(features, params)
+        metrics.count("beat_columns", len(columns))
+    labels = label_frames(features, params, metrics)
+    with metrics.stage("segment"):
+        times = columns * params["hop"] / params["sr"]
+        end = (n_frames - 1) * params["hop"] / params["sr"]
+        labels = merge_short_runs(labels, times, end, params["min_duration"])
+        chords = segment_labels(labels, times, end, template_bank(params["templates"])[0])
+    if "f0" in frames:
+        with metrics.stage("pitch"):
+            add_segment_pitch(chords, frames, params)
+    metrics.count("segments", len(chords))
     return chords
 
-# 🧠 Compare ideal vs practice chords and build summary
-def compare_chords(ideal, practice):
-    feedback = []
-    correct_count = 0
+# 🎸 Extract chords using template matching (✅ Optimized)
+# `features_dir` persists the chroma per recording and reuses it on later runs;
+# a stored `.npy` feature file can also be passed instead of audio.
+def extract_chords(audio_path, cache=None, metrics=None, features_dir=None, params=None, workers=1, cap_bytes=DECODE_CAP_BYTES):
+    return extract_track(audio_path, cache, metrics, features_dir, params, workers, cap_bytes)[0]
+
+# 🎸 extract_chords plus the track's pitch curve (None unless params["pitch"] is on), both
+# from one decode and one feature pass
+def extract_track(audio_path, cache=None, metrics=None, features_dir=None, params=None, workers=1, cap_bytes=DECODE_CAP_BYTES):
+    params = resolve_params(params)
+    metrics = metrics or NULL_METRICS
+    if audio_path.endswith(".npy"):
+        features, meta = load_feature_file(audio_path)
+        params = { **params, "sr": meta["sr"], "hop": meta["hop"] }
+        return chords_from_features(features, params, metrics), pitch_curve(features, params) if "f0" in features else None
+
+    if cache is not None:
+        key = cache.key(audio_path, analysis_params(params))
+        hit = cache.get(key)
+        curve = cache.get_curve(key) if hit is not None and params["pitch"] != "off" else None
+        if hit is not None and (curve is not None or params["pitch"] == "off"):
+            metrics.count("cache_hits")
+            return hit[0], curve
+
+    stored = load_features(features_dir, audio_path, feature_params(params)) if features_dir else None
+    if stored is not None:
+        features = stored[0]
+        metrics.count("feature_store_hits")
+    else:
+        features = analyse_audio(audio_path, params, metrics, workers, cap_bytes)
+        if features_dir:
+            save_features(features_dir, audio_path, features, { **feature_params(params), **track_tonality(features, params) })
+    chords = chords_from_features(features, params, metrics)
+    curve = pitch_curve(features, params) if "f0" in features else None
+
+    if cache is not None:
+        cache.put(key, chords, np.asarray(features["chroma"]), curve)
+    return chords, curve
+
+# 🎧 Decode + frame features for one file: whole-signal when it fits the decode cap, else block by block
+def analyse_audio(audio_path, params, metrics=None, workers=1, cap_bytes=DECODE_CAP_BYTES):
+    metrics = metrics or NULL_METRICS
+    size = decoded_bytes(audio_path, params["sr"])
+    if size is None or size > cap_bytes:
+        return stream_features(iter_audio(audio_path, params["sr"], params["resample"]), params, cap_bytes, metrics, workers)
+    y, sr = load_audio(audio_path, params["sr"], params["resample"], metrics)
+    metrics.count("samples", len(y))
+    with metrics.stage("chroma"):
+        return compute_features_chunked(y, params, workers)
+
+# 🗝️ Key (from the loud frames) and tuning of one analysed track; stored with its features
+def track_tonality(features, params):
+    chroma = np.asarray(features["chroma"])
+    active = gate_frames(np.asarray(features["rms"]), params) if "rms" in features else np.ones(chroma.shape[1], dtype=bool)
+    tuning = features.get("tuning")
+    return {
+        **estimate_key(chroma[:, active] if active.any() else chroma),
+        "tuningCents": None if tuning is None else round(tuning_cents(float(tuning), params), 1),
+    }
 
-    for i, p_chord in enumerate(practice):
-        match = i < len(ideal) and ideal[i]["chord"] == p_chord["chord"]
-        if match:
-            correct_count += 1
-        feedback.append({
-            **p_chord,
-            "correct": match
-        })
+# 📚 Analyse an ideal track once for the reference index: features (with the beat grid) go
+# next to the record, which holds chord segments, beat times, tempo, key and tuning
+def ingest_reference(audio_path, refs, params=None, metrics=None, workers=1, cap_bytes=DECODE_CAP_BYTES):
+    params = resolve_params(params)
+    metrics = metrics or NULL_METRICS
+    digest = file_digest(audio_path)
+    grid_params = { **params, "beat_sync": True }
+    features = analyse_audio(audio_path, grid_params, metrics, workers, cap_bytes)
+    tonality = track_tonality(features, params)
+    save_features(refs.root, audio_path, features, { **feature_params(grid_params), **tonality }, digest)
+    chords = chords_from_features(features, params, metrics)
+
+    seconds = params["hop"] / params["sr"]
+    beats = np.asarray(features["beats"]) * seconds
+    record = {
+        "hash": digest,
+        "source": os.path.basename(audio_path),
+        "params": params_digest(analysis_params(params)),
+        "duration": round((features["chroma"].shape[1] - 1) * seconds, 2),
+        "tempo": round(60 / float(np.median(np.diff(beats))) / params["subdivide"], 1) if len(beats) > 1 else None,
+        **tonality,
+        "beats": [round(float(t), 3) for t in beats],
+        "chords": chords,
+        **({ "pitchCurve": pitch_curve(features, params) } if "f0" in features else {}),
+        "ingested": round(time.time(), 3),
+    }
+    refs.add(digest, record)
+    return record
+
+REF_PREFIX = "ref:"  # compare args of the form ref:<sha256> name an ingested track directly
+
+# 🎯 Ideal-side chords: an O(1) reference lookup by content hash, falling back to analysis
+def ideal_chords(audio_path, refs, cache=None, metrics=None, features_dir=None, params=None, workers=1, cap_bytes=DECODE_CAP_BYTES):
+    params = resolve_params(params)
+    key = params_digest(analysis_params(params))
+    if audio_path.startswith(REF_PREFIX):
+        record = refs.get(audio_path[len(REF_PREFIX):], key) if refs else None
+        if record is None:
+            raise KeyError(f"no reference {audio_path} ingested with these params")
+    else:
+        record = refs.lookup(audio_path, key) if refs else None
+    if record is None:
+        return extract_chords(audio_path, cache, metrics, features_dir, params, workers, cap_bytes)
+    (metrics or NULL_METRICS).count("reference_hits")
+    return record["chords"]
+
+# 🧱 Frame features for audio that arrives in blocks. A frame is computed once
+# chroma_context() samples exist on both sides of it, so it matches what a whole-file
+# pass would give, and only that much audio is kept between calls.
+class FrameFeatureStream:
+    def __init__(self, params, tuning=None):
+        self.params = params
+        self.hop = params["hop"]
+        self.context = chroma_context(params)
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.offset = 0  # absolute sample index of buffer[0], always a multiple of hop
+        self.total = 0  # samples received so far
+        self.next_frame = 0  # first frame not yet computed
+        self.tuning = tuning  # estimated from the first window when None, then frozen
+
+    def push(self, block):
+        self.buffer = np.concatenate((self.buffer, np.asarray(block, dtype=np.float32).ravel()))
+        self.total += len(block)
+
+    # Frames computable so far: those with full right context, or all of them once input has ended
+    def ready(self, final=False):
+        return 1 + self.total // self.hop if final else (self.total - self.context) // self.hop + 1
+
+    # Features of frames [next_frame, stop), plus the onset envelope when beat_sync is on
+    def take(self, stop):
+        import warnings
+
+        first = self.next_frame
+        lo = max(0, first * self.hop - self.context)
+        hi = min(self.total, (stop - 1) * self.hop + self.context)
+        y = self.buffer[lo - self.offset:hi - self.offset]
+
+        if self.tuning is None:
+            self.tuning = estimate_tuning(y, self.params)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # short windows trip librosa's n_fft warning
+            features = compute_features(y, { **self.params, "beat_sync": False }, self.tuning)
+        base = lo // self.hop
+        features = { name: f[..., first - base:stop - base] for name, f in features.items() }
+        if self.params["beat_sync"]:
+            features["onset"] = onset_envelope(y, self.params)[(first - base) * ONSET_RATIO:(stop - base) * ONSET_RATIO]
+
+        # Keep only the left context the next frame will need
+        keep = max(0, stop * self.hop - self.context)
+        self.buffer = self.buffer[keep - self.offset:]
+        self.offset = keep
+        self.next_frame = stop
+        return features
+
+# 🌊 Features of a file decoded block by block. Up to cap_bytes of audio is buffered; a file
+# that ends within the cap takes the whole-signal path, a longer one is analysed incrementally
+# with tuning frozen from its opening, so peak memory stops growing with recording length.
+def stream_features(blocks, params, cap_bytes=DECODE_CAP_BYTES, metrics=None, workers=1):
+    metrics = metrics or NULL_METRICS
+    blocks = iter(blocks)
+    head, size = [], 0
+    with metrics.stage("load"):
+        for block in blocks:
+            head.append(block)
+            size += block.nbytes
+            if size > cap_bytes:
+                break
+    if size <= cap_bytes:
+        y = np.concatenate(head) if head else np.zeros(0, dtype=np.float32)
+        del head
+        metrics.count("samples", len(y))
+        with metrics.stage("chroma"):
+            return compute_features_chunked(y, params, workers)
+
+    opening = np.concatenate(head)[:int(TUNING_SECONDS * params["sr"])]
+    stream = FrameFeatureStream(params, estimate_tuning(opening, params))
+    parts = []
+    with metrics.stage("chroma"):
+        while True:
+            block = head.pop(0) if head else next(blocks, None)
+            final = block is None
+            if not final:
+                stream.push(block)
+                metrics.count("streamed_blocks")
+            stop = stream.ready(final)
+            if stop > stream.next_frame:
+                parts.append(stream.take(stop))
+            if final:
+                break
+    metrics.count("samples", stream.total)
+
+    features = { name: np.concatenate([part[name] for part in parts], axis=-1) for name in parts[0] }
+    if params["beat_sync"]:
+        features["beats"] = beats_from_onsets(features.pop("onset"), params)
+    features["tuning"] = np.array(stream.tuning, dtype=np.float32)
+    return features
+
+# 🎙️ Samples of one session chunk: raw PCM chunks are read as they are, anything else is decoded
+def load_chunk(chunk_path, params):
+    if chunk_path.endswith(PCM_CHUNK_EXT):
+        return np.fromfile(chunk_path, dtype="<f4")
+    return load_audio(chunk_path, params["sr"], params["resample"])[0]
+
+# 🧩 Frame features of a recording that arrives as consecutive chunk files. Each chunk leaves a
+# partial in `store_dir`: the frames it completes, computed by FrameFeatureStream with the
+# chroma_context() of audio before it. Partials are keyed by a hash chained over every earlier
+# chunk, so a repeated call only computes chunks it has not seen, and earlier audio is only
+# decoded again when a new chunk needs it as left context. `final` closes the recording: the last
+# chunk also takes the frames still waiting for right context. Partials are stitched at frame
+# level and decoded once by the caller, so chunk seams never split a chord.
+def chunk_features(chunk_paths, params=None, store_dir=DEFAULT_CHUNK_DIR, final=True, metrics=None):
+    metrics = metrics or NULL_METRICS
+    params = resolve_params(params)
+    stream = FrameFeatureStream(params)
+    hop = params["hop"]
+    key = params_digest(feature_params(params))
+    parts = []
+
+    # Put back the audio before chunk k that the next frame's left context reaches into
+    def rewind(k):
+        lo = max(0, stream.next_frame * hop - stream.context)
+        pieces, start = [stream.buffer], stream.offset
+        while start > lo:
+            k -= 1
+            pieces.insert(0, load_chunk(chunk_paths[k], params))
+            start -= len(pieces[0])
+        stream.buffer = np.concatenate(pieces)[lo - start:]
+        stream.offset = lo
+
+    for k, chunk_path in enumerate(chunk_paths):
+        last = final and k == len(chunk_paths) - 1
+        key = params_digest({ "previous": key, "chunk": file_digest(chunk_path), "final": last })
+        stored = load_features(store_dir, chunk_path, digest=key)
+        if stored is not None:
+            features, meta = stored
+            stream.total += meta["samples"]
+            stream.buffer, stream.offset = np.zeros(0, dtype=np.float32), stream.total
+            stream.next_frame, stream.tuning = meta["stop"], meta["tuning"]
+            metrics.count("chunk_hits")
+            parts.append(features)
+            continue
+
+        with metrics.stage("load"):
+            y = load_chunk(chunk_path, params)
+            rewind(k)
+        stream.push(y)
+        stop = stream.ready(last)
+        if stop > stream.next_frame:
+            with metrics.stage("chroma"):
+                features = stream.take(stop)
+        else:  # shorter than the context: its frames wait for the next chunk
+            features = { "chroma": np.zeros((12, 0), dtype=np.float32), "rms": np.zeros(0, dtype=np.float32) }
+            if params["beat_sync"]:
+                features["onset"] = np.zeros(0, dtype=np.float32)
+            if params["pitch"] != "off":
+                features["f0"] = np.zeros(0, dtype=np.float32)
+        tuning = None if stream.tuning is None else float(stream.tuning)
+        meta = { **feature_params(params), "chunk": k, "samples": len(y), "stop": stream.next_frame, "tuning": tuning }
+        save_features(store_dir, chunk_path, features, meta, digest=key)
+        metrics.count("chunks_computed")
+        parts.append(features)
+
+    if not parts:
+        return None
+    features = { name: np.concatenate([part[name] for part in parts], axis=-1) for name in parts[0] }
+    if params["beat_sync"] and final:
+        features["beats"] = beats_from_onsets(features.pop("onset"), params)
+    if stream.tuning is not None:
+        features["tuning"] = np.array(stream.tuning, dtype=np.float32)
+    return features
+
+# 🎙️ Incremental chord extraction for live audio. Tuning is estimated once the
+# class's TUNING_SECONDS of audio exist and then frozen.
+# Live feedback stays frame-level: beat_sync needs the whole track's beat grid, and
+# min_duration needs lookahead. The Viterbi decoder carries its state across blocks.
+class StreamingChordExtractor:
+    TUNING_SECONDS = 5.0  # audio gathered before tuning is estimated and frozen
+
+    def __init__(self, params=None):
+        self.params = { **resolve_params(params), "beat_sync": False }
+        self.sr = self.params["sr"]
+        self.hop = self.params["hop"]
+        self.frames = FrameFeatureStream(self.params)
+        self.peak_db = -np.inf  # loudest frame so far; the gate is relative to it
+        self.label = None  # template index of the still-open segment (-1 for a rest)
+        self.start_frame = 0
+        self.names = template_bank(self.params["templates"])[0]
+        self.decoder = {}  # smoothing state carried between blocks
+
+    def _time(self, frame):
+        return frame * self.hop / self.sr
+
+    # 📥 Add a block of mono float PCM; returns the segments it closed
+    def feed(self, block):
+        self.frames.push(block)
+        ready = self.frames.ready()
+        if ready <= self.frames.next_frame or (self.frames.tuning is None and self.frames.total < self.TUNING_SECONDS * self.sr):
+            return []
+        return self._advance(ready)
+
+    # 🏁 End of stream: classify the tail and close the open segment
+    def flush(self):
+        n_frames = self.frames.ready(final=True)
+        closed = self._advance(n_frames) if n_frames > self.frames.next_frame else []
+        if self.label is not None:
+            closed.append(_segment(self.label, self._time(self.start_frame), self._time(n_frames - 1), self.names))
+            self.label = None
+        return closed
+
+    def _advance(self, stop):
+        first = self.frames.next_frame
+        features = self.frames.take(stop)
+        self.peak_db = max(self.peak_db, float(features["rms"].max()))
+        labels = label_frames(features, self.params, peak_db=self.peak_db, state=self.decoder)
+
+        closed = []
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+        for i in starts:
+            idx = int(labels[i])
+            if self.label is None:
+                self.label, self.start_frame = idx, first + i
+            elif idx != self.label:
+                closed.append(_segment(self.label, self._time(self.start_frame), self._time(first + i), self.names))
+                self.label, self.start_frame = idx, first + i
+        return closed
+
+# 🌊 Raw PCM on stdin -> one JSON chord segment per line on stdout as each segment closes
+def stream_stdin(pcm_format="f32le", block_seconds=0.5, params=None):
+    dtype = np.dtype("<f4") if pcm_format == "f32le" else np.dtype("<i2")
+    scale = 1.0 if pcm_format == "f32le" else 1 / 32768
+    extractor = StreamingChordExtractor(params)
+    block_bytes = int(extractor.sr * block_seconds) * dtype.itemsize
+
+    def emit(segments):
+        for seg in segments:
+            sys.stdout.write(json.dumps(seg) + "\n")
+        sys.stdout.flush()
+
+    pending = b""
+    while True:
+        data = sys.stdin.buffer.read(block_bytes)
+        if not data:
+            break
+        data = pending + data
+        usable = len(data) - len(data) % dtype.itemsize
+        pending = data[usable:]
+        emit(extractor.feed(np.frombuffer(data[:usable], dtype=dtype) * scale))
+    emit(extractor.flush())
+
+# 🔗 Banded edit-distance alignment of two chord sequences.
+# Row i (ideal) only visits practice columns within `band` of the scaled
+# diagonal, so the cost is O(len * band) instead of O(len²) for long takes.
+ALIGN_BAND = 32
+_MATCH, _SUB, _INS, _DEL = 0, 1, 2, 3
+_OP_NAMES = ["match", "substitution", "insertion", "deletion"]
+
+def align_chords(ideal, practice, band=ALIGN_BAND):
+    n, m = len(ideal), len(practice)
+    scale = m / n if n else 0
+    lo = [max(0, int(i * scale) - band) for i in range(n + 1)]
+    hi = [min(m, int(np.ceil((i + 1) * scale)) + band) for i in range(n)] + [m]
+
+    inf = float("inf")
+    cost = []
+    back = []
+    for i in range(n + 1):
+        row = [inf] * (hi[i] - lo[i] + 1)
+        ptr = [_INS] * len(row)
+        prev, plo = (cost[i - 1], lo[i - 1]) if i else ([], 0)
+        for k in range(len(row)):
+            j = lo[i] + k
+            if i == 0 and j == 0:
+                row[k] = 0
+                continue
+            best, op = inf, _INS
+            if i and j and plo <= j - 1 < plo + len(prev):
+                same = ideal[i - 1]["chord"] == practice[j - 1]["chord"]
+                best, op = prev[j - 1 - plo] + (0 if same else 1), (_MATCH if same else _SUB)
+            if i and plo <= j < plo + len(prev) and prev[j - plo] + 1 < best:
+                best, op = prev[j - plo] + 1, _DEL
+            if k and row[k - 1] + 1 < best:
+                best, op = row[k - 1] + 1, _INS
+            row[k], ptr[k] = best, op
+        cost.append(row)
+        back.append(ptr)
+
+    pairs = []
+    i, j = n, m
+    while i or j:
+        op = back[i][j - lo[i]]
+        pair = { "op": _OP_NAMES[op], "ideal": None, "practice": None, "offset": None }
+        if op in (_MATCH, _SUB):
+            i, j = i - 1, j - 1
+            pair.update(ideal=i, practice=j, offset=round(practice[j]["start"] - ideal[i]["start"], 2))
+        elif op == _DEL:
+            i -= 1
+            pair["ideal"] = i
+        else:
+            j -= 1
+            pair["practice"] = j
+        pairs.append(pair)
+    pairs.reverse()
+    return pairs
+
+TRANSPOSE_MARGIN = 0.3  # cosine a rotation must gain over the untransposed reading to be taken
+TRANSPOSE_MIN_CHORDS = 6  # chords both takes need before a transposition is trusted
+
+# 🔀 Semitones (0-11) a take sits above the ideal, e.g. from a capo. Both chord lists become
+# duration-weighted (quality x root) histograms; the practice one is read at all 12 root
+# rotations with one gather and scored against the ideal one with one einsum. Returns the
+# accepted rotation and every rotation's cosine score. A rotation is only accepted when both
+# takes have TRANSPOSE_MIN_CHORDS chords and it beats the untransposed score by
+# TRANSPOSE_MARGIN: a short wrong take can be a rotation of the ideal by chance.
+def detect_transposition(ideal, practice):
+    hists = np.zeros((2, len(CHORD_QUALITIES), 12))
+    counts = [0, 0]
+    for h, chords in enumerate((ideal, practice)):
+        for c in chords:
+            if c["chord"] in CHORD_PARTS:
+                hists[(h, *CHORD_PARTS[c["chord"]])] += c["duration"]
+                counts[h] += 1
+    rotations = (np.arange(12)[:, None] + np.arange(12)) % 12  # [s, r]: root r moved up s semitones
+    scores = np.einsum("qsr,qr->s", hists[1][:, rotations], hists[0])
+    scores /= max(np.linalg.norm(hists[0]) * np.linalg.norm(hists[1]), 1e-9)
+    best = int(np.argmax(scores))
+    if min(counts) < TRANSPOSE_MIN_CHORDS or scores[best] - scores[0] < TRANSPOSE_MARGIN:
+        best = 0
+    return best, scores
+
+# 🎚️ Chord segments moved by `semitones`; rests and unknown labels are kept as they are
+def transpose_chords(chords, semitones):
+    if not semitones % 12:
+        return chords
+    qualities = list(CHORD_QUALITIES)
+    moved = []
+    for c in chords:
+        if c["chord"] in CHORD_PARTS:
+            k, r = CHORD_PARTS[c["chord"]]
+            c = { **c, "chord": ROOTS[(r + semitones) % 12] + qualities[k] }
+        moved.append(c)
+    return moved
 
-    total = len(practice)
+# 🧠 Compare ideal vs practice chords and build summary
+def compare_chords(ideal, practice, band=ALIGN_BAND, transpose=True):
+    feedback, counts, _, shift = _grade(ideal, practice, band, transpose)
+    return feedback, build_summary(feedback, counts, shift)
+
+# 📊 compare_chords plus the session statistics block, all from one alignment
+def grade_session(ideal, practice, band=ALIGN_BAND, transpose=True):
+    feedback, counts, aligned, shift = _grade(ideal, practice, band, transpose)
+    return feedback, build_summary(feedback, counts, shift), session_stats(*aligned)
+
+# Graded practice segments, alignment op counts, (ideal, practice, pairs) as aligned and the
+# transposition applied. With `transpose`, a take in another key is moved to the ideal's key
+# before alignment; feedback keeps the chords as played, stats use the ideal's key.
+# Segments with a pitch (params["pitch"]) also get their pitchOffset in cents from the ideal
+# segment they align with, octave-folded and net of the transposition.
+def _grade(ideal, practice, band, transpose=True):
+    # Rests are not chords to be graded
+    ideal = [c for c in ideal if c["chord"] != NO_CHORD]
+    played = [c for c in practice if c["chord"] != NO_CHORD]
+    shift = detect_transposition(ideal, played)[0] if transpose else 0
+    practice = transpose_chords(played, -shift)
+    feedback = [None] * len(practice)
+    counts = dict.fromkeys(_OP_NAMES, 0)
+    pairs = align_chords(ideal, practice, band)
+
+    for pair in pairs:
+        counts[pair["op"]] += 1
+        j = pair["practice"]
+        if j is None:
+            continue
+        match = pair["op"] == "match"
+        feedback[j] = {
+            **played[j],
+            "correct": match,
+            "offset": pair["offset"]
+        }
+        if "pitch" in played[j]:
+            i = pair["ideal"]
+            both = i is not None and ideal[i].get("pitch") and played[j]["pitch"]
+            cents = 1200 * np.log2(played[j]["pitch"] / ideal[i]["pitch"]) - 100 * shift if both else None
+            feedback[j]["pitchOffset"] = None if cents is None else round(float((cents + 600) % 1200 - 600), 1)
+
+    return feedback, counts, (ideal, practice, pairs), shift - 12 if shift > 6 else shift
+
+# 🏅 mic_summary of graded practice segments: accuracy, level, stars and guidance.
+# `counts` are the alignment's op counts (substitution/insertion/deletion), when known;
+# `transposition` the semitones the take was moved by before grading.
+def build_summary(feedback, counts=None, transposition=0):
+    counts = { **dict.fromkeys(_OP_NAMES, 0), **(counts or {}) }
+    total = len(feedback)
+    correct_count = sum(1 for f in feedback if f["correct"])
     accuracy = round((correct_count / max(total, 1)) * 100, 2)
     level = "Beginner"
     if accuracy >= 85:
@@ -96,6 +1005,8 @@ def compare_chords(ideal, practice):
 
     mistakes = [f for f in feedback if not f["correct"]]
     missing = [{"chord": m["chord"], "time": m["start"]} for m in mistakes]
+    pitched = [abs(f["pitchOffset"]) for f in feedback if f.get("pitchOffset") is not None]
+    pitch_accuracy = round(sum(c <= PITCH_TOLERANCE for c in pitched) / len(pitched) * 100, 2) if pitched else None
 
     # Auto-guidance
     if level == "Professional":
@@ -116,36 +1027,581 @@ def compare_chords(ideal, practice):
         "level": level,
         "stars": stars,
         "missingChords": missing,
+        "substitutions": counts["substitution"],
+        "insertions": counts["insertion"],
+        "deletions": counts["deletion"],
+        "transposition": transposition,
+        "pitchAccuracy": pitch_accuracy,
         "guidance": guidance,
         "tariff": tariff
     }
 
-    return feedback, mic_summary
-
-# 🚀 Entry point
-if __name__ == "__main__":
-    if len(sys.argv) == 2:
-        ideal_audio = sys.argv[1]
-        chords = extract_chords(ideal_audio)
-        print(json.dumps({ "feedback": chords }))
-
-    elif len(sys.argv) == 3:
-        ideal_audio = sys.argv[1]
-        practice_audio = sys.argv[2]
-
-        ideal_chords = extract_chords(ideal_audio)
-        practice_chords = extract_chords(practice_audio)
-
-        feedback, mic_summary = compare_chords(ideal_chords, practice_chords)
-
-        print(json.dumps({
+    return mic_summary
+
+# 🧰 Run one analysis job (used by the CLI and by server workers)
+def run_job(job):
+    if job.get("profile"):
+        return _profiled(job)
+
+    op = job.get("op")
+    args = job.get("args") or []
+    # Only the ideal side is cached: practice takes are almost never re-analyzed
+    cache = ChordCache(job["cache"], job.get("cacheMaxBytes", DEFAULT_MAX_BYTES)) if job.get("cache") else None
+    metrics = Metrics() if job.get("metrics") else None
+    features_dir = job.get("features")
+    params = job.get("params")
+    workers = job.get("chunkWorkers") or 1
+    cap_bytes = job.get("decodeCapBytes") or DECODE_CAP_BYTES
+    refs = ReferenceIndex(job["references"]) if job.get("references") else None
+    chunks = job.get("chunks")
+    chunk_store = job.get("chunkStore") or DEFAULT_CHUNK_DIR
+    transpose = resolve_params(params)["transpose"]
+    curve = None
+
+    if chunks and op == "chunks":
+        # Mid-session: store partials for the chunks so far, decode nothing yet
+        counter = metrics or Metrics()
+        features = chunk_features(chunks, params, chunk_store, final=False, metrics=counter)
+        result = { "chunks": len(chunks), "frames": int(features["chroma"].shape[1]), "computed": counter.counters.get("chunks_computed", 0) }
+
+    elif chunks and op in ("extract", "compare") and len(args) == (1 if op == "compare" else 0):
+        features = chunk_features(chunks, params, chunk_store, metrics=metrics)
+        practice_chords = chords_from_features(features, resolve_params(params), metrics)
+        curve = pitch_curve(features, resolve_params(params)) if "f0" in features else None
+        if op == "extract":
+            result = { "feedback": practice_chords }
+        else:
+            ideal = ideal_chords(args[0], refs, cache, metrics, features_dir, params, workers, cap_bytes)
+            with (metrics or NULL_METRICS).stage("compare"):
+                feedback, mic_summary, stats = grade_session(ideal, practice_chords, transpose=transpose)
+            result = { "feedback": feedback, "mic_summary": mic_summary, "stats": stats }
+
+    elif op == "extract" and len(args) == 1:
+        chords, curve = extract_track(args[0], cache, metrics, features_dir, params, workers, cap_bytes)
+        result = { "feedback": chords }
+
+    elif op == "ingest" and len(args) == 1 and refs is not None:
+        record = ingest_reference(args[0], refs, params, metrics, workers, cap_bytes)
+        curve = record.get("pitchCurve")
+        result = { "feedback": record["chords"], "reference": { k: v for k, v in record.items() if k not in ("chords", "beats", "pitchCurve") } }
+
+    elif op == "compare" and len(args) == 2:
+        ideal = ideal_chords(args[0], refs, cache, metrics, features_dir, params, workers, cap_bytes)
+        practice_chords, curve = extract_track(args[1], metrics=metrics, features_dir=features_dir, params=params, workers=workers, cap_bytes=cap_bytes)
+        with (metrics or NULL_METRICS).stage("compare"):
+            feedback, mic_summary, stats = grade_session(ideal, practice_chords, transpose=transpose)
+        result = {
             "feedback": feedback,
-            "mic_summary": mic_summary
-        }))
+            "mic_summary": mic_summary,
+            "stats": stats
+        }
 
     else:
-        print(json.dumps({ "error": "Invalid number of arguments" }))
+        return { "error": "Invalid number of arguments" }
+
+    if curve is not None:
+        result["pitchCurve"] = curve
+    if metrics is not None:
+        result["metrics"] = metrics.as_dict()
+    return result
+
+# 🔑 Dedup key of a job: same op on the same audio bytes with the same analysis params
+# (plus the compare-time transpose switch, which the chord caches do not depend on)
+def job_key(job):
+    paths = (job.get("args") or []) + (job.get("chunks") or [])
+    digests = [path[len(REF_PREFIX):] if path.startswith(REF_PREFIX) else file_digest(path) for path in paths]
+    params = { **analysis_params(job.get("params")), "transpose": resolve_params(job.get("params"))["transpose"] }
+    return "-".join([job.get("op") or "", *digests, params_digest(params)])
+
+# 📮 Queue requests, answered without the pool: "submit" wraps a job, "status" looks one up
+def queue_request(queue, request):
+    if request.get("op") == "submit":
+        job = request.get("job") or {}
+        try:
+            job_id, deduplicated = queue.submit(job, job_key(job))
+        except OSError as err:
+            return { "error": f"{type(err).__name__}: {err}" }
+        return { "jobId": job_id, "status": queue.get(job_id)["status"], "deduplicated": deduplicated }
+    entry = queue.get(request.get("jobId"))
+    return entry if entry is not None else { "error": "Unknown job id" }
+
+QUEUE_POLL_SECONDS = 0.5
+QUEUE_PURGE_SECONDS = 3600  # how often finished jobs past their retention are dropped
+
+# 🪵 Queue database errors go to stderr; the drainer carries on
+def _queue_error(err):
+    print(f"⚠️ job queue: {type(err).__name__}: {err}", file=sys.stderr, flush=True)
+
+# 📬 Drain the persistent queue into the worker pool, never more than `workers` jobs in flight.
+# Runs beside the server; jobs a crashed server left running are queued again on start.
+# Database errors (a locked or unavailable file) are logged and retried, never fatal.
+def run_queue(queue, pool, workers, stop=None):
+    stop = stop or threading.Event()
+    slots = threading.Semaphore(workers)
+    requeued, next_purge = False, 0
+
+    # A claimed job must always finish and give its slot back; a finish the database refuses
+    # leaves the job running, and the next start queues it again
+    def settle(job_id, result):
+        try:
+            queue.finish(job_id, result)
+        except sqlite3.Error as err:
+            _queue_error(err)
+        finally:
+            slots.release()
+
+    while not stop.is_set():
+        slots.acquire()
+        try:
+            if not requeued:
+                queue.requeue_running()
+                requeued = True
+            if time.monotonic() >= next_purge:
+                queue.purge()
+                next_purge = time.monotonic() + QUEUE_PURGE_SECONDS
+            claimed = queue.claim()
+        except sqlite3.Error as err:
+            _queue_error(err)
+            claimed = None
+        if claimed is None:
+            slots.release()
+            stop.wait(QUEUE_POLL_SECONDS)
+            continue
+        job_id, job = claimed
+
+        def done(future, job_id=job_id):
+            try:
+                result = future.result()
+            except Exception as err:
+                result = { "error": f"{type(err).__name__}: {err}" }
+            settle(job_id, result)
+
+        # A failed submit fails the job (so a resubmission retries it) and the drainer keeps going
+        try:
+            future = pool.submit(run_job, job)
+        except Exception as err:
+            settle(job_id, { "error": f"{type(err).__name__}: {err}" })
+            continue
+        future.add_done_callback(done)
+
+# 🔬 Run a job under cProfile; a directory gets one timestamped .pstats file per run
+def _profiled(job):
+    path = job["profile"]
+    if os.path.isdir(path):
+        path = os.path.join(path, f"predict-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.pstats")
+    profiler = cProfile.Profile()
+    result = profiler.runcall(run_job, { **job, "profile": None })
+    profiler.dump_stats(path)
+    return { **result, "profile": path }
+
+# 📋 Practice files listed in a manifest: a JSON array or one path per line ("#" starts a comment)
+def read_manifest(manifest_path):
+    with open(manifest_path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        paths = json.loads(text)
+    else:
+        paths = [line.strip() for line in text.splitlines()]
+        paths = [p for p in paths if p and not p.startswith("#")]
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    return [os.path.join(base, p) for p in paths]
+
+# 📦 Score many practice takes against one ideal: the ideal is extracted once, the
+# takes are extracted across a process pool, and one JSON result is yielded per file
+def run_batch(ideal_path, practice_paths, cache=None, workers=None, params=None):
+    ideal_chords = extract_chords(ideal_path, cache, params=params)
+    workers = min(workers or default_workers(), max(len(practice_paths), 1))
+    transpose = resolve_params(params)["transpose"]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(extract_chords, path, params=params): path for path in practice_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                feedback, mic_summary, stats = grade_session(ideal_chords, future.result(), transpose=transpose)
+            except Exception as err:
+                yield { "file": path, "error": f"{type(err).__name__}: {err}" }
+                continue
+            yield {
+                "file": path,
+                "feedback": feedback,
+                "mic_summary": mic_summary,
+                "stats": stats
+            }
+
+# 🔥 Load librosa and JIT-compile the chroma path once per worker
+def _warm_worker():
+    y = np.random.default_rng(0).standard_normal(3 * SR).astype(np.float32) * 0.01
+    compute_features(y, resolve_params())
+
+def _noop():
+    return os.getpid()
+
+# 🔁 The server's warm worker processes. A worker that dies (e.g. OOM-killed on a long upload)
+# breaks a ProcessPoolExecutor for good, so a broken executor is replaced by a fresh warm one:
+# the job that was running fails, everything after it runs normally.
+class WorkerPool:
+    def __init__(self, workers):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.executor = self._start()
+
+    def _start(self):
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        # Start every worker up front so the first real job is already warm
+        for f in [executor.submit(_noop) for _ in range(self.workers)]:
+            f.result()
+        return executor
+
+    def submit(self, fn, *args):
+        try:
+            return self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self.recover()
+            return self.executor.submit(fn, *args)
+
+    # Replace the executor if it is broken; concurrent callers rebuild it only once
+    def recover(self):
+        with self.lock:
+            try:
+                self.executor.submit(_noop)
+                return
+            except BrokenProcessPool:
+                self.executor.shutdown(wait=False)
+            self.executor = self._start()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+# 🧵 Execute a job in the pool (queue requests in this thread) and turn failures into JSON errors.
+# A job lost with a dead worker is answered with "poolError", so clients run it themselves.
+def _dispatch(pool, job, queue=None):
+    try:
+        if job.get("op") in ("submit", "status") and queue is not None:
+            result = queue_request(queue, job)
+        else:
+            result = pool.submit(run_job, job).result()
+    except BrokenProcessPool as err:
+        pool.recover()
+        result = { "error": f"{type(err).__name__}: {err}", "poolError": True }
+    except Exception as err:
+        result = { "error": f"{type(err).__name__}: {err}" }
+    if "id" in job:
+        result = { **result, "id": job["id"] }
+    return result
+
+# 🖥️ Long-running server: one JSON job per line in, one JSON result per line out.
+# Jobs queued at `queue_path` are drained into the same pool.
+def serve(socket_path=None, workers=None, queue_path=None):
+    workers = workers or default_workers()
+    pool = WorkerPool(workers)
+
+    queue, stop = (JobQueue(queue_path) if queue_path else None), threading.Event()
+    if queue is not None:
+        threading.Thread(target=run_queue, args=(queue, pool, workers, stop), daemon=True).start()
+    try:
+        if socket_path is None:
+            _serve_stdio(pool, queue)
+        else:
+            _serve_socket(pool, socket_path, queue)
+    finally:
+        stop.set()
+        pool.shutdown()
+
+def _serve_stdio(pool, queue=None):
+    lock = threading.Lock()
+
+    def reply(job):
+        result = _dispatch(pool, job, queue)
+        with lock:
+            sys.stdout.write(json.dumps(result) + "\n")
+            sys.stdout.flush()
+
+    threads = []
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError:
+            with lock:
+                sys.stdout.write(json.dumps({ "error": "Invalid JSON" }) + "\n")
+                sys.stdout.flush()
+            continue
+        t = threading.Thread(target=reply, args=(job,), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+def _serve_socket(pool, socket_path, queue=None):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = _dispatch(pool, json.loads(line), queue)
+                except ValueError:
+                    result = { "error": "Invalid JSON" }
+                self.wfile.write((json.dumps(result) + "\n").encode())
+                self.wfile.flush()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+# 📡 Send a job to a running server; returns None when no server is reachable, it does not
+# answer within SERVER_TIMEOUT_SECONDS or its worker pool lost the job, so the caller runs it locally
+def request_server(job, socket_path=SOCKET_PATH):
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(SERVER_TIMEOUT_SECONDS)
+            conn.connect(socket_path)
+            conn.sendall((json.dumps(job) + "\n").encode())
+            with conn.makefile("r") as reader:
+                line = reader.readline()
+        result = json.loads(line) if line else None
+    except (OSError, ValueError):  # socket.timeout is an OSError; ValueError is a reply cut short
+        return None
+    return None if result is None or result.get("poolError") else result
+
+# 🧭 Subcommands: name -> (help, positional dest, nargs, legacy flag it stands for).
+# Bare legacy argv (audio paths plus --serve/--batch/... flags) keeps working unchanged.
+COMMANDS = {
+    "extract": ("chord segments of one recording", "audio", 1, None),
+    "compare": ("grade a practice take against an ideal track (or ref:<hash>)", "audio", 2, None),
+    "batch": ("score practice takes against the first (ideal) file, one JSON line per file", "audio", "*", "batch"),
+    "ingest": ("analyse ideal tracks once into the reference index", "audio", "+", "ingest"),
+    "submit": ("queue an extract (one file) or compare (two files) and print its job id", "audio", "+", "submit"),
+    "status": ("status, and the result once done, of a queued job", "status", None, None),
+    "serve": ("run the persistent analysis server", None, None, "serve"),
+    "stream": ("print chord segments of mono PCM read from stdin as they close", None, None, "stream"),
+    "references": ("print the reference index", None, None, "list_references"),
+    "chunks": ("analyse a recording given as consecutive chunk files (graded when --ideal is given)", "audio", "+", "chunks"),
+    "aggregate": ("sum the stats of stored results (files, JSON lines, - for stdin) into one block", "audio", "+", "aggregate"),
+    "invalidate-cache": ("drop cached chords for the given audio (all entries if none given)", "audio", "*", "invalidate_cache"),
+}
 
+# Options shared by the legacy parser and every subcommand
+def _add_options(parser):
+    parser.add_argument("--stdio", action="store_true", help="with serve, speak JSON lines on stdin/stdout instead of a socket")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path of the analysis server")
+    parser.add_argument("--pcm-format", choices=["f32le", "s16le"], default="f32le", help="sample format for stream")
+    parser.add_argument("--metrics", "--timings", dest="metrics", action="store_true", help="add a metrics block (wall/CPU seconds per stage, frames, peak RSS) to the output")
+    parser.add_argument("--prom-file", help="also write the metrics in Prometheus text format to this file")
+    parser.add_argument("--profile", metavar="PATH", help="write cProfile stats for the run (a directory gets one file per run)")
+    parser.add_argument("--store-features", nargs="?", const=DEFAULT_FEATURE_DIR, default=None, metavar="DIR", help="persist per-recording chroma (.npy + JSON sidecar) and reuse it on later runs")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="result encoding: json (rows), columnar (parallel arrays + chord table) or msgpack (columnar, packed)")
+    parser.add_argument("--wait", action="store_true", help="with status, poll until the job has finished")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="job queue database, drained by serve (env PREDICT_QUEUE_DB)")
+    parser.add_argument("--references", default=DEFAULT_REFERENCE_DIR, help="reference index directory; compares look the ideal up here first (env PREDICT_REFERENCE_DIR)")
+    parser.add_argument("--ideal", help="with chunks, ideal track (or ref:<hash>) to grade the chunked recording against")
+    parser.add_argument("--partial", action="store_true", help="with chunks, the recording is still going: store partials for the chunks so far and print progress")
+    parser.add_argument("--chunk-store", default=DEFAULT_CHUNK_DIR, help="with chunks, directory of the per-chunk partial features")
+    parser.add_argument("--manifest", help="with batch, file listing practice paths (JSON array or one per line)")
+    parser.add_argument("--chroma", choices=CHROMA_MODES, help="chroma front-end (default: cqt; stft is ~3-5x faster, less accurate)")
+    parser.add_argument("--hop", type=int, help=f"hop length in samples (default: {HOP})")
+    parser.add_argument("--n-fft", type=int, help="STFT window for --chroma stft (default: 4096)")
+    parser.add_argument("--no-tuning", action="store_true", help="skip tuning estimation and assume A440")
+    parser.add_argument("--pitch", choices=PITCH_MODES[1:], help=f"also track pitch in the same pass: per-segment pitch, a pitchCurve of at most {PITCH_POINTS} points and, when grading, pitchAccuracy")
+    parser.add_argument("--no-transpose", action="store_true", help="grade takes literally, even when played in another key (capo)")
+    parser.add_argument("--no-gate", action="store_true", help="classify every frame, including silence")
+    parser.add_argument("--gate-db", type=float, help="rest threshold relative to the loudest frame (default: -40)")
+    parser.add_argument("--beat-sync", action="store_true", help="classify per beat instead of per frame (far fewer matches and segments)")
+    parser.add_argument("--subdivide", type=int, help="with --beat-sync, columns per beat (default: 1)")
+    parser.add_argument("--templates", choices=tuple(TEMPLATE_SETS), help="chord vocabulary (default: triads, 24 major/minor chords)")
+    parser.add_argument("--smooth", choices=SMOOTHING_MODES, help="frame decoder (default: viterbi)")
+    parser.add_argument("--switch-prob", type=float, help="viterbi chord-change prior per frame (default: 0.05)")
+    parser.add_argument("--min-duration", type=float, help="merge segments shorter than this many seconds (default: 0.25, 0 disables)")
+    parser.add_argument("--workers", type=int, default=None, help=f"warm worker processes (default: usable CPUs, at most {MAX_DEFAULT_WORKERS}; env PREDICT_WORKERS)")
+    parser.add_argument("--chunk-workers", type=int, help=f"compute chroma of recordings over {CHUNK_SECONDS:g} s in parallel windows across this many processes")
+    parser.add_argument("--decode-cap-mb", type=float, help=f"analyse longer recordings block by block (default: {DECODE_CAP_BYTES / 2**20:g}, env PREDICT_DECODE_CAP_MB)")
+    parser.add_argument("--local", action="store_true", help="never forward to a running server")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="ideal-track chord cache directory")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20, help="evict least recently used entries above this size")
+    parser.add_argument("--no-cache", action="store_true", help="always re-extract the ideal track")
+
+def _legacy_parser():
+    parser = argparse.ArgumentParser(description="Chord extraction and comparison", epilog=f"subcommands: {', '.join(COMMANDS)} (predict.py <subcommand> -h)")
+    parser.add_argument("audio", nargs="*", help="ideal audio, optionally followed by practice audio")
+    parser.add_argument("--serve", action="store_true", help="run as a persistent analysis server")
+    parser.add_argument("--stream", action="store_true", help="read mono PCM at 22050 Hz from stdin and print chord segments as they close")
+    parser.add_argument("--submit", action="store_true", help="queue the analysis instead of running it; prints a job id (identical submissions share one)")
+    parser.add_argument("--status", metavar="JOB_ID", help="print status, and the result once done, of a queued job")
+    parser.add_argument("--ingest", action="store_true", help="analyse ideal tracks once into the reference index (chords, beat grid, tempo, key)")
+    parser.add_argument("--list-references", action="store_true", help="print the reference index")
+    parser.add_argument("--batch", action="store_true", help="score every practice file against the first (ideal) file, one JSON line per file")
+    parser.add_argument("--invalidate-cache", action="store_true", help="drop cached entries for the given audio (all entries if none given)")
+    parser.add_argument("--chunks", action="store_true", help="treat the inputs as consecutive chunks of one recording (see the chunks subcommand)")
+    parser.add_argument("--aggregate", action="store_true", help="treat the inputs as stored results and print their summed session stats")
+    _add_options(parser)
+    return parser
+
+# 🎚️ `predict.py <subcommand> ...` or the legacy flat form; both give the same namespace
+def parse_args(argv):
+    legacy = _legacy_parser()
+    if not argv or argv[0] not in COMMANDS:
+        return legacy.parse_args(argv)
+
+    parser = argparse.ArgumentParser(prog="predict.py", description="Chord extraction and comparison")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, (help_text, dest, nargs, _) in COMMANDS.items():
+        sub = commands.add_parser(name, help=help_text, description=help_text)
+        if dest == "status":
+            sub.add_argument("status", metavar="JOB_ID")
+        elif dest is not None:
+            sub.add_argument(dest, nargs=nargs, metavar="FILE")
+        _add_options(sub)
+    args = parser.parse_args(argv, namespace=legacy.parse_args([]))
+    flag = COMMANDS[args.command][3]
+    if flag is not None:
+        setattr(args, flag, True)
+    return args
+
+# 🎛️ Analysis overrides given on the command line
+def params_from_args(args):
+    params = { "chroma": args.chroma, "hop": args.hop, "n_fft": args.n_fft, "gate_db": args.gate_db, "subdivide": args.subdivide, "templates": args.templates,
+               "smooth": args.smooth, "switch_prob": args.switch_prob, "min_duration": args.min_duration, "pitch": args.pitch }
+    params = { k: v for k, v in params.items() if v is not None }
+    if args.no_tuning:
+        params["tuning"] = False
+    if args.no_gate:
+        params["gate"] = False
+    if args.no_transpose:
+        params["transpose"] = False
+    if args.beat_sync:
+        params["beat_sync"] = True
+    return params
+
+def _emit(result):
+    print(json.dumps(result), flush=True)
+
+# 🚀 Entry point; `argv` defaults to the process arguments
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    params = params_from_args(args)
+
+    if args.serve:
+        serve(None if args.stdio else args.socket, args.workers, args.queue)
+        return
+
+    if args.stream:
+        stream_stdin(args.pcm_format, params=params)
+        return
+
+    if args.status:
+        queue = JobQueue(args.queue)
+        entry = queue.get(args.status)
+        while args.wait and entry is not None and entry["status"] in ("queued", "running"):
+            time.sleep(QUEUE_POLL_SECONDS)
+            entry = queue.get(args.status)
+        _emit(entry if entry is not None else { "error": "Unknown job id" })
+        return
+
+    if args.list_references:
+        _emit(ReferenceIndex(args.references).entries())
+        return
+
+    if args.aggregate:
+        try:
+            result = aggregate_stats(read_stats(args.audio))
+        except (OSError, ValueError, KeyError) as err:
+            result = { "error": f"{type(err).__name__}: {err}" }
+        _emit(result)
+        return
+
+    if args.invalidate_cache:
+        cache = ChordCache(args.cache_dir)
+        removed = sum(cache.invalidate(a) for a in args.audio) if args.audio else cache.invalidate()
+        _emit({ "invalidated": removed })
+        return
+
+    # Validation happens before anything heavy is imported, so bad input fails in milliseconds.
+    # Batch takes are not checked here: run_batch reports a missing take in its own result line.
+    practice = args.audio[1:] + (read_manifest(args.manifest) if args.batch and args.manifest else [])
+    inputs = args.audio[:1] + ([] if args.batch else practice) + ([args.ideal] if args.chunks and args.ideal else [])
+    missing = [a for a in inputs if not a.startswith(REF_PREFIX) and not os.path.isfile(a)]
+    if missing:
+        _emit({ "error": f"File not found: {missing[0]}" })
+        return
+
+    if args.batch:
+        if not args.audio or not practice:
+            _emit({ "error": "Batch mode needs an ideal file and at least one practice file" })
+            return
+        cache = None if args.no_cache else ChordCache(args.cache_dir, int(args.cache_max_mb * 2**20))
+        for result in run_batch(args.audio[0], practice, cache, args.workers, params):
+            _emit(result)
+        return
+
+    if args.ingest:
+        for path in args.audio:
+            job = { "op": "ingest", "args": [os.path.abspath(path)], "references": os.path.abspath(args.references), "params": params }
+            result = None if args.local else request_server(job, args.socket)
+            _emit(result if result is not None else run_job(job))
+        return
+
+    if args.chunks:
+        op = "chunks" if args.partial else "compare" if args.ideal else "extract"
+        job = { "op": op, "args": [args.ideal] if args.ideal else [], "chunks": [os.path.abspath(c) for c in args.audio], "chunkStore": os.path.abspath(args.chunk_store) }
+    elif len(args.audio) == 1:
+        job = { "op": "extract", "args": args.audio }
+    elif len(args.audio) == 2:
+        job = { "op": "compare", "args": args.audio }
+    else:
+        _emit({ "error": "Invalid number of arguments" })
+        return
+
+    job["args"] = [a if a.startswith(REF_PREFIX) else os.path.abspath(a) for a in job["args"]]
+    job["references"] = os.path.abspath(args.references)
+    if params:
+        job["params"] = params
+    if args.metrics or args.prom_file:
+        job["metrics"] = True
+    if args.chunk_workers:
+        job["chunkWorkers"] = args.chunk_workers
+    if args.decode_cap_mb:
+        job["decodeCapBytes"] = int(args.decode_cap_mb * 2**20)
+    if args.profile:
+        job["profile"] = os.path.abspath(args.profile)
+    if args.store_features:
+        job["features"] = os.path.abspath(args.store_features)
+    if not args.no_cache:
+        job["cache"] = os.path.abspath(args.cache_dir)
+        job["cacheMaxBytes"] = int(args.cache_max_mb * 2**20)
+    if args.submit:
+        _emit(queue_request(JobQueue(args.queue), { "op": "submit", "job": job }))
+        return
+    result = None if args.local else request_server(job, args.socket)
+    if result is None:
+        result = run_job(job)
+    if args.prom_file and "metrics" in result:
+        with open(args.prom_file, "w") as f:
+            f.write(prometheus_text(result["metrics"]))
+        if not args.metrics:
+            del result["metrics"]
+    try:
+        output = encode(result, args.format)
+    except ImportError:
+        output = encode({ "error": f"--format {args.format} needs the {args.format} package" })
+    sys.stdout.buffer.write(output + (b"\n" if args.format != "msgpack" else b""))
+    sys.stdout.buffer.flush()
+
+if __name__ == "__main__":
+    main()
 
 '''import sys
 import json
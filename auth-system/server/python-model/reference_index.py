@@ -0,0 +1,69 @@
+import os
+import json
+
+from chord_cache import file_digest
+
+# 📚 Reference (ideal) tracks analysed once at upload: <sha256>.ref.json holds the chord segments,
+# beat grid, tempo and key next to the track's stored features, and index.json lists every track.
+# A compare finds its ideal side by content hash instead of analysing it again.
+DEFAULT_REFERENCE_DIR = os.environ.get(
+    "PREDICT_REFERENCE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "references")
+)
+SUMMARY_SKIP = ("chords", "beats", "pitchCurve")  # bulky fields kept out of index.json
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class ReferenceIndex:
+    def __init__(self, root=DEFAULT_REFERENCE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest + ".ref.json")
+
+    # 🔎 Record for a content hash, or None when missing or analysed with other params
+    def get(self, digest, params_key=None):
+        try:
+            with open(self._path(digest)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if params_key is not None and record.get("params") != params_key:
+            return None
+        return record
+
+    def lookup(self, audio_path, params_key=None):
+        return self.get(file_digest(audio_path), params_key)
+
+    # 📤 Store a record and list it in the index; the index update is serialized across processes
+    def add(self, digest, record):
+        os.makedirs(self.root, exist_ok=True)
+        _write_json(self._path(digest), record)
+        with self._locked():
+            index = self.entries()
+            index[digest] = { k: v for k, v in record.items() if k not in SUMMARY_SKIP }
+            _write_json(self.index_path, index)
+
+    # 📇 { hash: summary } for every ingested track
+    def entries(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _locked(self):
+        lock = open(os.path.join(self.root, "index.lock"), "w")
+        try:
+            import fcntl
+
+            fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+        except ImportError:
+            pass
+        return lock
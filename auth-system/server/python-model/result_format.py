@@ -0,0 +1,63 @@
+import json
+
+# 📦 Output encodings. "json" is the historical list of per-segment dicts; "columnar" keeps the
+# same top-level keys but turns each segment list into parallel arrays, with chord names
+# replaced by small ints into one shared "chords" table; "msgpack" is columnar, packed.
+FORMATS = ("json", "columnar", "msgpack")
+SEGMENT_LISTS = ("feedback",)
+
+
+# 🧱 List of segment dicts -> { key: [values...] }, chord names as ids into `table`
+def _columns(segments, table, index):
+    keys = list(dict.fromkeys(k for segment in segments for k in segment))
+    columns = { k: [segment.get(k) for segment in segments] for k in keys }
+    if "chord" in columns:
+        ids = []
+        for name in columns["chord"]:
+            if name not in index:
+                index[name] = len(table)
+                table.append(name)
+            ids.append(index[name])
+        columns["chord"] = ids
+    if "correct" in columns:
+        columns["correct"] = [int(bool(c)) for c in columns["correct"]]
+    return columns
+
+# 🗜️ Result dict -> columnar dict (top-level keys that are not segment lists pass through)
+def to_columnar(result):
+    table, index = [], {}
+    out = { "format": "columnar", "chords": table }
+    for key, value in result.items():
+        out[key] = _columns(value, table, index) if key in SEGMENT_LISTS and isinstance(value, list) else value
+    return out
+
+# 🔙 Columnar dict -> the plain result dict, for consumers that want rows back
+def from_columnar(block):
+    table = block["chords"]
+    result = {}
+    for key, value in block.items():
+        if key in ("format", "chords"):
+            continue
+        if key in SEGMENT_LISTS and isinstance(value, dict):
+            n = len(next(iter(value.values()), []))
+            rows = [{ k: column[i] for k, column in value.items() } for i in range(n)]
+            for row in rows:
+                if "chord" in row:
+                    row["chord"] = table[row["chord"]]
+                if "correct" in row:
+                    row["correct"] = bool(row["correct"])
+            value = rows
+        result[key] = value
+    return result
+
+# 📤 Result dict -> bytes for stdout
+def encode(result, fmt="json"):
+    if fmt == "json" or "error" in result:
+        return json.dumps(result).encode()
+    if fmt == "columnar":
+        return json.dumps(to_columnar(result), separators=(",", ":")).encode()
+    if fmt == "msgpack":
+        import msgpack
+
+        return msgpack.packb(to_columnar(result), use_bin_type=True)
+    raise ValueError(f"unknown result format {fmt!r}, expected one of {FORMATS}")
@@ -0,0 +1,138 @@
+import sys
+import json
+
+# 📊 Session statistics from one chord alignment (predict.align_chords): per-chord accuracy,
+# transition errors, substitutions and a timing histogram. Every block keeps the raw counts
+# next to the derived numbers, so blocks of many sessions sum into one (aggregate_stats).
+OFFSET_EDGES = [-1.0, -0.5, -0.25, -0.1, 0.1, 0.25, 0.5, 1.0]  # seconds; the outer bins are open
+
+
+# 🧮 Sum the value rows that share a key row: (n x k) keys, (n x v) values -> unique keys, sums
+def _sum_by(keys, values, k, v):
+    import numpy as np
+
+    keys = np.asarray(keys, dtype=np.int64).reshape(-1, k)
+    values = np.asarray(values, dtype=np.float64).reshape(-1, v)
+    if not len(keys):
+        return keys, values
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    sums = np.zeros((len(unique), values.shape[1]))
+    np.add.at(sums, inverse.ravel(), values)
+    return unique, sums
+
+# 🧱 Counts -> the stats block; shared by single sessions and aggregates
+def _block(names, chords, transitions, confusions, timing, abs_offset_sum, sessions):
+    import numpy as np
+
+    ids, counts = chords
+    total, correct = counts[:, 0], counts[:, 1]
+    accuracy = np.round(correct / np.maximum(total, 1) * 100, 2)
+    best = worst = None
+    if len(ids):
+        # Ties go to the chord heard most often
+        b, w = np.lexsort((-total, -accuracy))[0], np.lexsort((-total, accuracy))[0]
+        best = names[ids[b, 0]] if accuracy[b] > 0 else None
+        worst = names[ids[w, 0]] if accuracy[w] < 100 else None
+
+    pair_ids, pair_counts = transitions
+    order = np.lexsort((-pair_counts[:, 0], -pair_counts[:, 1])) if len(pair_ids) else []
+    sub_ids, sub_counts = confusions
+    sub_order = np.argsort(-sub_counts[:, 0], kind="stable") if len(sub_ids) else []
+    matched = int(timing.sum())
+
+    return {
+        "sessions": sessions,
+        "bestChord": best,
+        "worstChord": worst,
+        "perChord": [
+            { "chord": names[k], "total": int(t), "correct": int(c), "accuracy": float(a) }
+            for k, t, c, a in zip(ids[:, 0], total, correct, accuracy)
+        ],
+        "transitions": [
+            { "from": names[pair_ids[i, 0]], "to": names[pair_ids[i, 1]], "total": int(pair_counts[i, 0]), "errors": int(pair_counts[i, 1]) }
+            for i in order
+        ],
+        "confusions": [
+            { "expected": names[sub_ids[i, 0]], "played": names[sub_ids[i, 1]], "count": int(sub_counts[i, 0]) }
+            for i in sub_order
+        ],
+        "timing": {
+            "edges": OFFSET_EDGES,
+            "counts": [int(c) for c in timing],
+            "matched": matched,
+            "absOffsetSum": round(float(abs_offset_sum), 3),
+            "meanAbsOffset": round(float(abs_offset_sum) / max(matched, 1), 3)
+        }
+    }
+
+# 🎯 Stats of one graded session. `ideal` and `practice` are the chord lists that were aligned
+# (rests removed), `pairs` the alignment. Accuracy is per expected chord: a chord counts
+# as correct where the ideal wanted it and it was played there. A transition is wrong when
+# either of its two ideal chords was missed. Timing covers the correctly played chords,
+# measured from the take's median offset so a lead-in or late start does not shift every bin.
+def session_stats(ideal, practice, pairs):
+    import numpy as np
+
+    names = sorted({ c["chord"] for c in ideal } | { c["chord"] for c in practice })
+    index = { name: k for k, name in enumerate(names) }
+    expected = np.array([index[ideal[p["ideal"]]["chord"]] if p["ideal"] is not None else -1 for p in pairs], dtype=np.int64)
+    played = np.array([index[practice[p["practice"]]["chord"]] if p["practice"] is not None else -1 for p in pairs], dtype=np.int64)
+    offsets = np.array([np.nan if p["offset"] is None else p["offset"] for p in pairs], dtype=np.float64)
+
+    graded = expected >= 0
+    match = graded & (expected == played)
+    ids, ok = expected[graded], match[graded]  # the ideal sequence, in order
+    chords = _sum_by(ids, np.stack([np.ones(len(ids)), ok], axis=1), 1, 2)
+    transitions = _sum_by(np.stack([ids[:-1], ids[1:]], axis=1), np.stack([np.ones(max(len(ids) - 1, 0)), ~(ok[:-1] & ok[1:])], axis=1), 2, 2)
+    substituted = graded & (played >= 0) & ~match
+    confusions = _sum_by(np.stack([expected[substituted], played[substituted]], axis=1), np.ones(int(substituted.sum())), 2, 1)
+    matched = offsets[match]
+    matched = matched - np.median(matched) if len(matched) else matched
+    timing = np.bincount(np.searchsorted(OFFSET_EDGES, matched, side="right"), minlength=len(OFFSET_EDGES) + 1)
+    return _block(names, chords, transitions, confusions, timing, np.abs(matched).sum(), 1)
+
+# ➕ One block for many sessions (e.g. every stored result of a user); empty blocks are skipped
+def aggregate_stats(blocks):
+    import numpy as np
+
+    blocks = [b for b in blocks if b]
+    for b in blocks:
+        if b["timing"]["edges"] != OFFSET_EDGES:
+            raise ValueError("timing histograms with different bin edges cannot be summed")
+    names = sorted({ row["chord"] for b in blocks for row in b["perChord"] }
+                   | { row[k] for b in blocks for row in b["transitions"] for k in ("from", "to") }
+                   | { row[k] for b in blocks for row in b["confusions"] for k in ("expected", "played") })
+    index = { name: k for k, name in enumerate(names) }
+
+    def rows(key, columns, counts):
+        selected = [row for b in blocks for row in b[key]]
+        return _sum_by([[index[row[c]] for c in columns] for row in selected], [[row[c] for c in counts] for row in selected], len(columns), len(counts))
+
+    timing = np.sum([b["timing"]["counts"] for b in blocks], axis=0) if blocks else np.zeros(len(OFFSET_EDGES) + 1, dtype=np.int64)
+    return _block(
+        names,
+        rows("perChord", ("chord",), ("total", "correct")),
+        rows("transitions", ("from", "to"), ("total", "errors")),
+        rows("confusions", ("expected", "played"), ("count",)),
+        timing,
+        sum(b["timing"]["absOffsetSum"] for b in blocks),
+        sum(b["sessions"] for b in blocks),
+    )
+
+# 📥 Stats blocks stored in files: a result JSON (its "stats" key), a bare stats block,
+# a JSON array of either, or JSON lines; "-" reads stdin
+def read_stats(paths):
+    blocks = []
+    for path in paths:
+        if path == "-":
+            text = sys.stdin.read()
+        else:
+            with open(path) as f:
+                text = f.read()
+        try:
+            items = json.loads(text)
+        except ValueError:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        items = items if isinstance(items, list) else [items]
+        blocks += [item.get("stats", item) for item in items if "stats" in item or "perChord" in item]
+    return blocks
@@ -0,0 +1,33 @@
+import pytest
+
+import predict
+from session_stats import OFFSET_EDGES, session_stats
+
+
+def _take(names, seconds=1.0, lead_in=0.0, jitter=()):
+    return [{ "chord": name, "start": lead_in + i * seconds + (jitter[i] if i < len(jitter) else 0.0), "duration": seconds, "stringIndex": 0, "correct": True }
+            for i, name in enumerate(names)]
+
+PROGRESSION = ["C", "G", "Am", "F", "C", "G", "F", "C"]
+JITTER = [0.0, 0.05, -0.2, 0.3, 0.0, -0.6, 0.15, 0.0]
+
+
+def _stats(ideal, practice):
+    pairs = predict.align_chords(ideal, practice)
+    return session_stats(ideal, practice, pairs)
+
+
+def test_lead_in_does_not_shift_the_timing_histogram():
+    ideal = _take(PROGRESSION)
+    on_time = _stats(ideal, _take(PROGRESSION, jitter=JITTER))
+    shifted = _stats(ideal, _take(PROGRESSION, lead_in=2.0, jitter=JITTER))
+    assert shifted["timing"]["counts"] == on_time["timing"]["counts"]
+    assert shifted["timing"]["meanAbsOffset"] == pytest.approx(on_time["timing"]["meanAbsOffset"], abs=0.01)
+    assert shifted["timing"]["matched"] == len(PROGRESSION)
+
+
+def test_steady_take_with_a_lead_in_is_on_time():
+    stats = _stats(_take(PROGRESSION), _take(PROGRESSION, lead_in=2.0))
+    centre = OFFSET_EDGES.index(-0.1) + 1  # the (-0.1, 0.1] bin
+    assert stats["timing"]["counts"][centre] == len(PROGRESSION)
+    assert stats["timing"]["meanAbsOffset"] == 0
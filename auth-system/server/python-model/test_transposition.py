@@ -0,0 +1,38 @@
+import predict
+
+
+def _take(names, seconds=1.0):
+    return [{ "chord": name, "start": i * seconds, "duration": seconds, "stringIndex": 0, "correct": True } for i, name in enumerate(names)]
+
+PROGRESSION = ["C", "G", "Am", "F", "C", "G", "F", "C"]
+
+
+def test_capo_take_is_graded_in_the_ideal_key():
+    _, summary = predict.compare_chords(_take(PROGRESSION), predict.transpose_chords(_take(PROGRESSION), 2))
+    assert summary["transposition"] == 2
+    assert summary["accuracy"] == 100
+
+
+def test_short_wrong_take_that_rotates_onto_the_ideal_is_not_transposed():
+    ideal = _take(["C", "G", "Am", "F"])
+    practice = _take(["D", "A", "Bm", "G"])  # every chord wrong, but a +2 rotation of the ideal
+    shift, scores = predict.detect_transposition(ideal, practice)
+    assert scores[2] > scores[0]
+    assert shift == 0
+    _, summary = predict.compare_chords(ideal, practice)
+    assert summary["transposition"] == 0
+    assert summary["accuracy"] == 0
+
+
+def test_rotation_needs_a_clear_margin_over_the_untransposed_reading():
+    # Half in the ideal key, half two semitones up: +2 scores best, but not by TRANSPOSE_MARGIN
+    practice = _take(PROGRESSION[:4]) + predict.transpose_chords(_take(PROGRESSION[4:]), 2)
+    shift, scores = predict.detect_transposition(_take(PROGRESSION), practice)
+    assert 0 < scores[2] - scores[0] < predict.TRANSPOSE_MARGIN
+    assert shift == 0
+
+
+def test_no_transpose_grades_literally():
+    _, summary = predict.compare_chords(_take(PROGRESSION), predict.transpose_chords(_take(PROGRESSION), 2), transpose=False)
+    assert summary["transposition"] == 0
+    assert summary["accuracy"] < 50
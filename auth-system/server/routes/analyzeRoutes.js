@@ -1,7 +1,7 @@
 const express = require("express");
 const multer = require("multer");
 const path = require("path");
-const { analyzeAudio } = require("../controller/analyzeController");
+const { analyzeAudio, submitAnalysis, analysisStatus, userStats } = require("../controller/analyzeController");
 
 const router = express.Router();
 
@@ -18,4 +18,11 @@ const upload = multer({ storage });
 // Main route: Accepts optional 'practice' file + 'idealPath' from client
 router.post("/analyze", upload.single("practice"), analyzeAudio);
 
+// Queued variant: submit returns a job id at once, poll it until status is "done"
+router.post("/analyze/jobs", upload.single("practice"), submitAnalysis);
+router.get("/analyze/jobs/:id", analysisStatus);
+
+// Dashboard: per-chord, transition and timing stats summed over a user's stored sessions
+router.get("/analyze/stats/:userId", userStats);
+
 module.exports = router;
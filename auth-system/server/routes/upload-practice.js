@@ -3,6 +3,8 @@ const express = require("express");
 const multer = require("multer");
 const path = require("path");
 const { exec } = require("child_process");
+const { parsePredictOutput, PREDICT_MAX_BUFFER } = require("../utils/predictResult");
+const { PITCH_ARGS } = require("../utils/predictArgs");
 const router = express.Router();
 
 const storage = multer.diskStorage({
@@ -26,16 +28,17 @@ router.post("/upload-practice", upload.single("practice"), (req, res) => {
   // const python = `"C:/Program Files/Python312/python.exe"`;
   const script = path.join(__dirname, "../python-model/predict.py");
 
-  const command = `${python} "${script}" "${idealPath}" "${practicePath}"`;
+  // Columnar output keeps long recordings well under the stdout buffer
+  const command = `${python} "${script}" --format columnar ${PITCH_ARGS.join(" ")} "${idealPath}" "${practicePath}"`;
 
-  exec(command, (err, stdout, stderr) => {
+  exec(command, { maxBuffer: PREDICT_MAX_BUFFER }, (err, stdout, stderr) => {
     if (err) {
       console.error("Python error:", stderr);
       return res.status(500).json({ message: "Python script failed" });
     }
 
     try {
-      const result = JSON.parse(stdout);
+      const result = parsePredictOutput(stdout);
       res.status(200).json(result);
     } catch (e) {
       console.error("JSON parse error:", stdout);
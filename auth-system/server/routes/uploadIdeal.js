@@ -3,6 +3,8 @@ const multer = require("multer");
 const path = require("path");
 const fs = require("fs");
 const { exec } = require("child_process");
+const { PITCH_ARGS } = require("../utils/predictArgs");
+const { PREDICT_MAX_BUFFER } = require("../utils/predictResult");
 
 const router = express.Router();
 
@@ -43,7 +45,9 @@ router.post("/upload-ideal", upload.single("ideal"), (req, res) => {
 
      const python = "python3"; // ✅ Use python3 on Render
   const script = path.join(__dirname, "..", "python-model", "predict.py");
-  const command = `${python} "${script}" "${idealPath}"`;
+  // --ingest stores chords, beat grid and key once; compares then look the ideal up by hash
+  // (with the same PITCH_ARGS as the mic compares, so the lookup matches)
+  const command = `${python} "${script}" --ingest ${PITCH_ARGS.join(" ")} "${idealPath}"`;
 
    /* const python = `"C:/Program Files/Python312/python.exe"`; // Adjust if needed
     const script = path.join(__dirname, "..", "python-model", "predict.py");
@@ -51,7 +55,7 @@ router.post("/upload-ideal", upload.single("ideal"), (req, res) => {
 
     console.log("👉 Running command:", command);
 
-    exec(command, (err, stdout, stderr) => {
+    exec(command, { maxBuffer: PREDICT_MAX_BUFFER }, (err, stdout, stderr) => {
       if (err) {
         console.error("❌ Python error:", stderr);
         return res.status(500).json({ message: "Python script failed" });
@@ -63,6 +67,7 @@ router.post("/upload-ideal", upload.single("ideal"), (req, res) => {
           message: "✅ Ideal audio uploaded and analyzed",
           idealPath: "/uploads/ideal.wav",
           feedback: result.feedback,
+          pitchCurve: result.pitchCurve,
         });
       } catch (e) {
         console.error("❌ JSON parse error:", stdout);
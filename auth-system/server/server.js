@@ -6,9 +6,11 @@ const fs = require("fs");
 const dotenv = require("dotenv");
 const http = require("http");
 const socketIo = require("socket.io");
-const { exec } = require("child_process");
-const ffmpeg = require("fluent-ffmpeg");
+const { exec, execFile, spawn } = require("child_process");
 const cleanupScript = path.join(__dirname, "cleanupChunks.js");
+const { parsePredictOutput, PREDICT_MAX_BUFFER } = require("./utils/predictResult");
+const { PITCH_ARGS } = require("./utils/predictArgs");
+const Feedback = require("./models/FeedbackModel");
 
 
 // FFmpeg setup
@@ -73,6 +75,10 @@ const chunksDir = path.join(uploadDir, "chunks");
 if (!fs.existsSync(uploadDir)) fs.mkdirSync(uploadDir, { recursive: true });
 if (!fs.existsSync(chunksDir)) fs.mkdirSync(chunksDir, { recursive: true });
 
+const predictScript = path.join(__dirname, "python-model", "predict.py");
+const CHUNK_SECONDS = 5; // mic audio is analysed in chunks of this length while recording
+const CHUNK_BYTES = CHUNK_SECONDS * 22050 * 4; // f32le mono at predict.py's analysis rate
+
 // Default route
 app.get("/", (req, res) => {
   res.send("🎸 Aaroh AI Backend Running");
@@ -82,252 +88,215 @@ app.get("/", (req, res) => {
 io.on("connection", (socket) => {
   console.log("✅ User connected:", socket.id);
 
-  let userChunkFiles = {};
-
-  socket.on("mic-audio-chunk", (buffer) => {
-    const filename = `chunk_${Date.now()}_${Math.floor(Math.random() * 9999)}.webm`;
-    const chunkPath = path.join(chunksDir, filename);
-    fs.writeFileSync(chunkPath, Buffer.from(buffer));
-
-    if (!userChunkFiles[socket.id]) userChunkFiles[socket.id] = [];
-    userChunkFiles[socket.id].push(chunkPath);
-
-    console.log("✅ Saved chunk:", filename);
-  });
-
-  socket.on("mic-recording-end", () => {
-  console.log("🎤 mic-recording-end event received");
-
-  const chunkPaths = userChunkFiles[socket.id] || [];
-  console.log("📦 Chunks to merge:", chunkPaths.length);
-  console.log("🧾 Chunk paths:", chunkPaths);
-
-  if (chunkPaths.length === 0) {
-    console.log("❌ No chunks to merge");
-    socket.emit("status", "❌ No chunks recorded.");
-    return;
-  }
-
-  const timestamp = Date.now();
-  const mergedWebmPath = path.join(uploadDir, `merged_${timestamp}.webm`);
-  const mergedWavPath = mergedWebmPath.replace(".webm", ".wav");
-  const fileListPath = path.join(uploadDir, `filelist_${timestamp}.txt`);
-  const idealPath = path.join(uploadDir, "ideal.wav");
+  let liveAnalyzers = {};
+
+  // 🎙️ Live feedback: ffmpeg decodes the chunk stream to PCM, predict.py --stream emits chords as they close
+  const startLiveAnalyzer = () => {
+    const decoder = spawn(ffmpegPath, ["-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", "22050", "pipe:1"]);
+    const analyzer = spawn("python3", [predictScript, "--stream"]);
+    decoder.stdout.pipe(analyzer.stdin);
+    decoder.stdin.on("error", () => {}); // decoder may exit before the last write
+    analyzer.stdin.on("error", () => {});
+    decoder.on("error", (err) => console.error("❌ Live decoder error:", err.message));
+    analyzer.on("error", (err) => console.error("❌ Live analyzer error:", err.message));
+
+    let pending = "";
+    analyzer.stdout.on("data", (data) => {
+      pending += data.toString();
+      const lines = pending.split("\n");
+      pending = lines.pop();
+      lines.filter(Boolean).forEach((line) => {
+        try {
+          socket.emit("mic-live-chord", JSON.parse(line));
+        } catch (err) {
+          console.error("❌ Live chord parse error:", line);
+        }
+      });
+    });
 
-  const fileListContent = chunkPaths.map(p => `file '${p.replace(/\\/g, "/")}'`).join('\n');
-  fs.writeFileSync(fileListPath, fileListContent);
-  console.log("📄 File list content:\n", fileListContent);
+    return { decoder, analyzer, chunks: startChunkSession(decoder) };
+  };
+
+  // 🧩 The decoded PCM is also cut into CHUNK_SECONDS chunk files. Each full chunk is analysed
+  // right away (predict.py chunks --partial stores its features), so ending the session only
+  // pays for the last, partial chunk.
+  const startChunkSession = (decoder) => {
+    // Chunk names carry a per-session id: a new recording on the same socket must never
+    // overwrite files a previous session's final run is still reading
+    const session = { id: Date.now().toString(36), paths: [], pending: [], bytes: 0, running: false, again: false, onIdle: null };
+
+    const writeChunk = (data) => {
+      const chunkPath = path.join(chunksDir, `pcm_${socket.id}_${session.id}_${String(session.paths.length).padStart(5, "0")}.f32`);
+      fs.writeFileSync(chunkPath, data);
+      session.paths.push(chunkPath);
+    };
+
+    // One background run at a time; chunks that arrive meanwhile go to the next run
+    const analyse = () => {
+      if (session.running) {
+        session.again = true;
+        return;
+      }
+      session.running = true;
+      execFile("python3", [predictScript, "chunks", "--partial", ...PITCH_ARGS, ...session.paths], { maxBuffer: PREDICT_MAX_BUFFER }, (err, stdout, stderr) => {
+        if (err) console.error("❌ Chunk analysis error:", stderr);
+        session.running = false;
+        if (session.again) {
+          session.again = false;
+          analyse();
+        } else if (session.onIdle) {
+          session.onIdle();
+        }
+      });
+    };
+
+    decoder.stdout.on("data", (data) => {
+      session.pending.push(data);
+      session.bytes += data.length;
+      if (session.bytes < CHUNK_BYTES) return;
+      let pcm = Buffer.concat(session.pending);
+      while (pcm.length >= CHUNK_BYTES) {
+        writeChunk(pcm.subarray(0, CHUNK_BYTES));
+        pcm = pcm.subarray(CHUNK_BYTES);
+      }
+      session.pending = [pcm];
+      session.bytes = pcm.length;
+      analyse();
+    });
 
-  const ffmpegCmd = `${ffmpegPath} -f concat -safe 0 -i "${fileListPath}" -c:v libvpx -b:v 1M -c:a libvorbis "${mergedWebmPath}"`;
+    // 🏁 Close the decoder, write what is left as the last chunk and hand over every chunk path
+    // once the background run has finished
+    session.finish = (done) => {
+      decoder.stdout.on("end", () => {
+        if (session.bytes) writeChunk(Buffer.concat(session.pending));
+        const settle = () => done(session.paths);
+        if (session.running) session.onIdle = settle;
+        else settle();
+      });
+      decoder.stdin.end();
+    };
+
+    return session;
+  };
+
+  // 📤 Final feedback from predict.py's compare result (mic_summary + stats)
+  const emitFinalFeedback = (result) => {
+    const summary = result.mic_summary || {};
+    const stats = result.stats || {};
+    const last = result.feedback[result.feedback.length - 1];
+
+    // Wrong transitions between the chords the ideal track asked for
+    const transitionList = (stats.transitions || [])
+      .filter(t => t.errors > 0)
+      .map(t => ({ from: t.from, to: t.to, count: t.errors }));
+
+    // Keep the stats so dashboards can aggregate sessions without the raw feedback
+    Feedback.create({
+      userId: socket.handshake.auth?.userId || socket.handshake.query?.userId,
+      totalChords: summary.totalChords,
+      correctChords: summary.correctChords,
+      wrongChords: summary.mistakes,
+      accuracy: summary.accuracy,
+      starRating: summary.stars,
+      pitchAccuracy: summary.pitchAccuracy,
+      transposition: summary.transposition,
+      stats
+    }).catch(err => console.error("❌ Could not save feedback:", err.message));
+
+    socket.emit("mic-final-feedback", {
+      summary: {
+        totalChords: summary.totalChords,
+        correctChords: summary.correctChords,
+        mistakes: summary.mistakes,
+        accuracy: summary.accuracy,
+        level: summary.level,
+        stars: summary.stars,
+        missingChords: summary.missingChords,
+        transposition: summary.transposition,
+        pitchAccuracy: summary.pitchAccuracy,
+        pitchCurve: result.pitchCurve,
+        bestChord: stats.bestChord,
+        worstChord: stats.worstChord,
+        duration: last ? last.start + last.duration : 0,
+        transitionsWrong: transitionList,
+        perChord: stats.perChord,
+        timing: stats.timing,
+        guidance: summary.guidance,
+        tariff: summary.tariff
+      }
+    });
+  };
 
-  console.log("🔧 FFmpeg merge command:", ffmpegCmd);
-  console.log("🔁 Step 2: Merging chunks...");
-  socket.emit("status", "🔁 Step 2: Merging chunks...");
+  // 🧠 Grade the whole take: cached chunk features are stitched, only uncached chunks are computed
+  const finishSession = (chunkPaths) => {
+    console.log("📦 Chunks to grade:", chunkPaths.length);
+    const idealPath = path.join(uploadDir, "ideal.wav");
+    const removeChunks = () => chunkPaths.forEach((p) => fs.unlink(p, () => {}));
 
-  exec(ffmpegCmd, (err, stdout, stderr) => {
-    if (err) {
-      console.error("❌ FFmpeg merge error:", stderr);
-      socket.emit("status", "❌ Chunk merging failed.");
+    if (chunkPaths.length === 0) {
+      socket.emit("status", "❌ No chunks recorded.");
       return;
     }
-
-    console.log("📤 FFmpeg merge output:", stdout);
-    console.log("✅ Step 3: Chunks merged");
-    socket.emit("status", "✅ Step 3: Chunks merged");
-
-    if (!fs.existsSync(mergedWebmPath)) {
-      console.error("❌ Merged WebM not found:", mergedWebmPath);
-      socket.emit("status", "❌ Merged WebM missing.");
+    if (!fs.existsSync(idealPath)) {
+      removeChunks();
+      socket.emit("status", "❌ ideal.wav not found");
       return;
     }
 
-    ffmpeg(mergedWebmPath)
-      .output(mergedWavPath)
-      .audioCodec('pcm_s16le')
-      .format('wav')
-      .on("end", () => {
-        console.log("✅ Step 4: Converted to WAV");
-        socket.emit("status", "✅ Step 4: Converted to WAV");
-
-        const pythonPath = "python3"; // ✅ For Render/Linux
-
-const scriptPath = path.join(__dirname, "python-model", "predict.py"); // ✅ Adjust if needed
-const cmd = `${pythonPath} "${scriptPath}" "${idealPath}" "${mergedWavPath}"`;
-
-       /* const pythonPath = `"C:/Program Files/Python312/python.exe"`; // Update if needed
-        const scriptPath = path.join(__dirname, "python-model", "predict.py");
-        const cmd = `${pythonPath} "${scriptPath}" "${idealPath}" "${mergedWavPath}"`;*/
-
-        console.log("👉 Running command:");
-        console.log("🧠 Step 5: Analyzing audio...");
-        socket.emit("status", "🧠 Step 5: Analyzing audio...");
-
-        exec(cmd, (err, stdout, stderr) => {
-          if (err) {
-            console.error("❌ Python error:", stderr);
-            socket.emit("status", "❌ Python processing failed.");
-            return;
-          }
-
-          try {
-          const result = JSON.parse(stdout);
-          // Process feedback details
-const total = result.feedback.length;
-const correct = result.feedback.filter(f => f.correct).length;
-const mistakes = total - correct;
-const accuracy = result.accuracy || 0;
-const level = result.level || "Beginner";
-const stars = accuracy >= 90 ? 5 : accuracy >= 75 ? 4 : accuracy >= 60 ? 3 : accuracy >= 40 ? 2 : 1;
-
-// Missing chords
-const missingChords = result.feedback
-  .filter(f => !f.correct)
-  .map(f => ({ chord: f.chord, time: f.start }));
-
-// Best and worst chords
-const chordStats = {};
-result.feedback.forEach(f => {
-  if (!chordStats[f.chord]) chordStats[f.chord] = { correct: 0, total: 0 };
-  chordStats[f.chord].total += 1;
-  if (f.correct) chordStats[f.chord].correct += 1;
-});
-
-let bestChord = null;
-let worstChord = null;
-let bestAccuracy = 0;
-let worstAccuracy = 1;
+    console.log("🧠 Step 2: Analyzing last chunk...");
+    socket.emit("status", "🧠 Step 2: Analyzing last chunk...");
 
-for (const [chord, stats] of Object.entries(chordStats)) {
-  const acc = stats.correct / stats.total;
-  if (acc > bestAccuracy) {
-    bestAccuracy = acc;
-    bestChord = chord;
-  }
-  if (acc < worstAccuracy) {
-    worstAccuracy = acc;
-    worstChord = chord;
-  }
-}
+    const args = [predictScript, "chunks", "--ideal", idealPath, "--format", "columnar", ...PITCH_ARGS, ...chunkPaths];
+    execFile("python3", args, { maxBuffer: PREDICT_MAX_BUFFER }, (err, stdout, stderr) => {
+      removeChunks();
+      if (err) {
+        console.error("❌ Python error:", stderr);
+        socket.emit("status", "❌ Python processing failed.");
+        return;
+      }
 
-// Transition mistakes
-const transitionsWrong = {};
-for (let i = 1; i < result.feedback.length; i++) {
-  const prev = result.feedback[i - 1];
-  const curr = result.feedback[i];
-  if (!prev.correct || !curr.correct) {
-    const key = `${prev.chord}->${curr.chord}`;
-    transitionsWrong[key] = (transitionsWrong[key] || 0) + 1;
-  }
-}
-const transitionList = Object.entries(transitionsWrong).map(([k, v]) => {
-  const [from, to] = k.split("->");
-  return { from, to, count: v };
-});
+      try {
+        emitFinalFeedback(parsePredictOutput(stdout));
+        console.log("✅ Step 3: Feedback sent");
+        socket.emit("status", "✅ Step 3: Feedback sent");
+      } catch (err) {
+        console.error("❌ JSON parse error:", stdout);
+        socket.emit("status", "❌ Failed to parse AI output.");
+      }
+    });
+  };
 
-// Duration
-const duration = result.feedback[result.feedback.length - 1]?.end || 0;
-
-// Auto guidance
-let guidance = "";
-let tariff = "";
-if (level === "Professional") {
-  guidance = "Excellent! You’re at a professional level. Keep refining your chord transitions.";
-  tariff = "🔥 You nailed it! 🎸";
-} else if (level === "Intermediate") {
-  guidance = "You're doing well. Focus on accuracy and tempo balance.";
-  tariff = "🚀 Solid progress! Push a little more for perfection.";
-} else {
-  guidance = "You're at the Beginner level. Practice slow transitions, especially between F, C, and Am chords.";
-  tariff = "💪 Great start! Keep practicing daily and you'll hit Intermediate soon!";
-}
+  socket.on("mic-audio-chunk", (buffer) => {
+    if (!liveAnalyzers[socket.id]) liveAnalyzers[socket.id] = startLiveAnalyzer();
+    liveAnalyzers[socket.id].decoder.stdin.write(Buffer.from(buffer));
+  });
 
-// Emit final summary
-socket.emit("mic-final-feedback", {
-  summary: {
-    totalChords: total,
-    correctChords: correct,
-    mistakes,
-    accuracy,
-    level,
-    stars,
-    missingChords,
-    bestChord,
-    worstChord,
-    duration,
-    transitionsWrong: transitionList,
-    guidance,
-    tariff
-  }
-});
+  socket.on("mic-recording-end", () => {
+    console.log("🎤 mic-recording-end event received");
 
-/*const total = result.feedback.length;
-const correct = result.feedback.filter(f => f.correct).length;
-const mistakes = total - correct;
-const accuracy = result.accuracy || 0;
-const level = result.level || "Beginner";
-const stars = accuracy >= 90 ? 5 : accuracy >= 75 ? 4 : accuracy >= 60 ? 3 : accuracy >= 40 ? 2 : 1;
-
-const missing = result.feedback
-  .filter(f => !f.correct)
-  .map(f => ({
-    chord: f.chord,
-    time: f.start
-  }));
-
-// Auto guidance
-let guidance = "";
-let tariff = "";
-
-if (level === "Professional") {
-  guidance = "Excellent! You’re at a professional level. Keep refining your chord transitions.";
-  tariff = "🔥 You nailed it! 🎸";
-} else if (level === "Intermediate") {
-  guidance = "You're doing well. Focus on accuracy and tempo balance.";
-  tariff = "🚀 Solid progress! Push a little more for perfection.";
-} else {
-  guidance = "You're at the Beginner level. Practice slow transitions, especially between F, C, and Am chords.";
-  tariff = "💪 Great start! Keep practicing daily and you'll hit Intermediate soon!";
-}
+    const live = liveAnalyzers[socket.id];
+    if (!live) {
+      console.log("❌ No chunks recorded");
+      socket.emit("status", "❌ No chunks recorded.");
+      return;
+    }
+    delete liveAnalyzers[socket.id];
 
-socket.emit("chord-feedback", result.feedback); // raw feedback if needed
-
-// Human-readable box format
-socket.emit("mic-final-feedback", {
-  mic_summary: {
-    totalChords: total,
-    correctChords: correct,
-    mistakes,
-    accuracy,
-    level,
-    stars,
-    missingChords: missing,
-    guidance,
-    tariff
-  }
-});*/
-
-            console.log("✅ Step 6: Feedback sent");
-            socket.emit("status", "✅ Step 6: Feedback sent");
-          } catch (err) {
-            console.error("❌ JSON parse error:", stdout);
-            socket.emit("status", "❌ Failed to parse AI output.");
-          }
-        });
-      })
-      .on("error", (err) => {
-        console.error("❌ FFmpeg WAV error:", err.message);
-        console.error("❌ Full FFmpeg error:", err);
-        socket.emit("status", "❌ WAV conversion failed.");
-      })
-      .run(); // Start the ffmpeg process
+    // Closing the decoder's input lets the live analyzer flush its last chord
+    // and the chunk session write its last chunk
+    live.chunks.finish(finishSession);
   });
-});
-
 
   socket.on("disconnect", () => {
     console.log("❌ User disconnected:", socket.id);
     // Optional: Cleanup if any unmerged chunks remain
 
+    if (liveAnalyzers[socket.id]) {
+      liveAnalyzers[socket.id].decoder.kill();
+      liveAnalyzers[socket.id].analyzer.kill();
+      liveAnalyzers[socket.id].chunks.paths.forEach((p) => fs.unlink(p, () => {}));
+      delete liveAnalyzers[socket.id];
+    }
   });
 });
 setInterval(() => {
@@ -335,6 +304,20 @@ setInterval(() => {
   exec(`node "${cleanupScript}"`);
 }, 5 * 60 * 1000); // every 5 minutes
 
+// 🧠 Persistent analysis server: predict.py calls forward to it instead of re-importing librosa.
+// Restarted when it dies; until it is back, predict.py calls run locally.
+const PREDICT_RESTART_MS = 5000;
+const PREDICT_WORKERS = String(process.env.PREDICT_WORKERS || 2); // each worker holds its own librosa heap
+const startPredictServer = () => {
+  const predictServer = spawn("python3", [predictScript, "--serve", "--workers", PREDICT_WORKERS], { stdio: "inherit" });
+  predictServer.on("error", (err) => console.error("❌ predict.py server failed to start:", err.message));
+  predictServer.on("exit", (code, signal) => {
+    console.log("⚠️ predict.py server exited with", signal || `code ${code}`, "- restarting");
+    setTimeout(startPredictServer, PREDICT_RESTART_MS);
+  });
+};
+startPredictServer();
+
 // Start MongoDB + Server
 mongoose
   .connect(process.env.MONGO_URI, {})
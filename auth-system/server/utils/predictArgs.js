@@ -0,0 +1,6 @@
+// 🎛️ predict.py options shared by the ideal ingest and the mic compares. They are part of the
+// analysis params that key the reference index, so both sides must pass the same ones or a
+// compare never finds the ingested ideal (and re-analyses it every time).
+const PITCH_ARGS = ["--pitch", "yin"]; // pitch curve + pitchAccuracy from the same pass
+
+module.exports = { PITCH_ARGS };
@@ -0,0 +1,36 @@
+// 🗜️ predict.py --format columnar -> the row-per-segment shape the handlers already use.
+// Columnar output ships each segment list as parallel arrays with chord ids into one
+// shared `chords` table, so long takes stay small and cheap to parse.
+const SEGMENT_LISTS = ["feedback"];
+// stdout cap for predict.py calls; exec's 1 MB default overflows on long recordings
+const PREDICT_MAX_BUFFER = 64 * 1024 * 1024;
+
+function expandColumnar(block) {
+  const result = {};
+  for (const [key, value] of Object.entries(block)) {
+    if (key === "format" || key === "chords") continue;
+    if (!SEGMENT_LISTS.includes(key) || Array.isArray(value)) {
+      result[key] = value;
+      continue;
+    }
+    const columns = Object.entries(value);
+    const n = columns.length ? columns[0][1].length : 0;
+    const rows = new Array(n);
+    for (let i = 0; i < n; i++) {
+      const row = {};
+      for (const [name, column] of columns) row[name] = column[i];
+      if ("chord" in row) row.chord = block.chords[row.chord];
+      if ("correct" in row) row.correct = Boolean(row.correct);
+      rows[i] = row;
+    }
+    result[key] = rows;
+  }
+  return result;
+}
+
+function parsePredictOutput(stdout) {
+  const result = JSON.parse(stdout);
+  return result.format === "columnar" ? expandColumnar(result) : result;
+}
+
+module.exports = { parsePredictOutput, expandColumnar, PREDICT_MAX_BUFFER };